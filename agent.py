@@ -1,49 +1,87 @@
 """
 LangChain-based Focus Assistant agent with ReAct reasoning loop.
 
-The agent uses Groq (Llama 3.1) via LangChain and has two tools:
-  - save_priority: persist a user priority for future recall
-  - get_priorities: semantically search past priorities and conversations
+The agent uses Groq (Llama 3.1) via LangChain and has three tools:
+  - save_priority: persist a user priority, merging restatements of a saved one
+  - complete_priority: mark a saved priority as done
+  - get_priorities: keyword + semantic search over past priorities and conversations
 
 Uses a ReAct (Reason + Act) loop — the agent explicitly thinks about
 what to do, then decides whether to use a tool or respond directly.
+AGENT_MODE=tools swaps the text protocol for the model's native
+tool calls, with the same tools and memory context.
+Messages that router.py judges to need no tool skip the loop and get a
+single completion.
 """
 
+import asyncio
+import functools
+import logging
 import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from langchain_groq import ChatGroq
-from langchain_core.tools import tool
-from langchain_core.prompts import PromptTemplate
-from langchain.agents import AgentExecutor, create_react_agent
+# LangChain and the Groq client are imported on first use (or by warm_up()):
+# together they take over a second, and the API should answer /health first.
+if TYPE_CHECKING:
+    from langchain.agents import AgentExecutor
+    from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+    from langchain_core.tools import BaseTool
+    from tracing import AgentTracer
 
+import metrics
+import router
 from database import (
     get_setting,
-    save_priority as db_save_priority,
+    run_db,
+    get_memory_version,
+    get_cached_response,
+    put_cached_response,
     get_all_priorities,
-    get_latest_summary,
+    get_summary_digest,
 )
 from memory import (
-    get_history,
-    semantic_search,
-    format_history_for_prompt,
-    save_turn,
-    _collection,
+    aget_history,
+    hybrid_search,
+    ahybrid_search,
+    assemble_context,
+    asave_turn,
+    get_idempotent_turn,
+    upsert_priority,
+    find_similar_priority,
+    set_priority_status,
+    warm_up as memory_warm_up,
 )
 
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
 # ── LLM (lazy init) ──────────────────────────────────────────────
 
 MODEL = os.getenv("MODEL_NAME", "llama-3.1-8b-instant")
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "512"))
+# react: text Thought/Action protocol; tools: the provider's native tool calls
+AGENT_MODE = os.getenv("AGENT_MODE", "react")
+AGENT_MODES = ("react", "tools")
 
 _llm = None
 
 
 def _get_llm():
     global _llm
+    if _llm is None and MODEL == "fake":
+        # Load testing: ReAct-speaking stand-in, see fake_llm.py
+        from fake_llm import FakeReActChatModel
+        _llm = FakeReActChatModel()
     if _llm is None:
+        from langchain_groq import ChatGroq
         _llm = ChatGroq(
             model_name=MODEL,
             max_tokens=MAX_TOKENS,
@@ -53,27 +91,40 @@ def _get_llm():
 
 
 # ── Tools ─────────────────────────────────────────────────────────
+#
+# Plain functions here; _get_tools() wraps them with langchain's @tool on
+# first use. Each docstring is the description the model sees.
+
+# "I shipped the demo" is looser than a restated goal, so completion
+# matches at a lower similarity than de-duplication does.
+PRIORITY_MATCH_THRESHOLD = 0.6
 
-@tool
 def save_priority(text: str) -> str:
     """Save a user priority, goal, or important item for future reference.
     Use this when the user mentions a new priority, goal, deadline, or
     something they want to track across sessions."""
-    row_id = db_save_priority(text)
-    _collection.add(
-        documents=[f"Priority: {text}"],
-        metadatas=[{"type": "priority", "session_id": "default", "priority_id": str(row_id)}],
-        ids=[f"priority_{row_id}"],
-    )
+    priority_id, merged = upsert_priority(text)
+    if merged:
+        return f"Updated existing priority #{priority_id}: {text}"
     return f"Saved priority: {text}"
 
 
-@tool
+def complete_priority(text: str) -> str:
+    """Mark one of the user's saved priorities as done.
+    Use this when the user says they finished or no longer need to track
+    a goal. Pass the priority as the user described it."""
+    match = find_similar_priority(text, threshold=PRIORITY_MATCH_THRESHOLD)
+    if match is None:
+        return "No matching active priority found."
+    set_priority_status(match["id"], "done")
+    return f"Marked priority #{match['id']} as done: {match['text']}"
+
+
 def get_priorities(query: str) -> str:
-    """Retrieve relevant past priorities and conversation context via semantic search.
+    """Retrieve relevant past priorities and conversation context via keyword and semantic search.
     Use this when you need to recall what the user previously said about their
     goals, priorities, blockers, or recurring themes. Pass a descriptive query."""
-    results = semantic_search(query, n_results=5)
+    results = hybrid_search(query, n_results=5)
     if not results:
         return "No relevant past priorities or context found."
 
@@ -83,20 +134,28 @@ def get_priorities(query: str) -> str:
     return "\n".join(lines)
 
 
-TOOLS = [save_priority, get_priorities]
+_TOOL_FUNCTIONS = (save_priority, complete_priority, get_priorities)
+_tools: Optional[List["BaseTool"]] = None
+
+
+def _get_tools() -> List["BaseTool"]:
+    global _tools
+    if _tools is None:
+        from langchain_core.tools import tool
+        _tools = [tool(fn) for fn in _TOOL_FUNCTIONS]
+    return _tools
 
 
 # ── ReAct Prompt Template ────────────────────────────────────────
 
-REACT_PROMPT = PromptTemplate.from_template("""\
+# Everything up to "Begin!" is the same for every message from a user, so
+# the dynamic context goes after it and provider prefix caching can reuse
+# the instructions and tool descriptions.
+PERSONA_TEMPLATE = """\
 You are Sage AI, a warm and personal focus assistant for {user_name}.
 Your role is to help {user_name} stay on top of their priorities, surface patterns \
 in their thinking, and prompt useful reflection.
 
-{context_block}
-
-{cold_start_instruction}
-
 Guidelines:
 - Address {user_name} by name naturally — not in every sentence, but often enough to feel personal.
 - Only reference priorities or goals {user_name} has explicitly mentioned — never invent them.
@@ -107,7 +166,9 @@ Guidelines:
 - If the conversation history does not contain relevant context for this message, \
 respond based only on what the user just said and ask a clarifying question. \
 Do not fabricate past priorities or goals.
+"""
 
+REACT_TEMPLATE = PERSONA_TEMPLATE + """
 You have access to the following tools:
 
 {tools}
@@ -133,26 +194,118 @@ Do NOT include any text before the first "Thought:".
 
 Tool names: {tool_names}
 
+{context_block}
+
+{cold_start_instruction}
+
 Begin!
 
 Question: {input}
-{agent_scratchpad}""")
+{agent_scratchpad}"""
 
+# Fast path (see router.py): same persona and context, no tool scaffolding,
+# one completion.
+DIRECT_TEMPLATE = PERSONA_TEMPLATE + """
+{context_block}
 
-def _build_agent(user_message: str):
-    """Construct the AgentExecutor with context-aware prompt."""
-    user_name = get_setting("user_name", "there")
-    session_id = "default"
+{cold_start_instruction}
 
-    # Gather context
-    history = get_history(limit=10, session_id=session_id)
-    semantic_results = semantic_search(user_message, n_results=3, session_id=session_id)
-    summary = get_latest_summary(session_id)
+Reply to {user_name}'s message below in your own words; no tools are needed.
 
+Message: {input}
+Reply:"""
+
+# Tool-calling mode: tool schemas go through the API and the model answers
+# or calls a tool natively, so there is no text protocol to spell out in
+# the prompt or to mis-parse and retry.
+TOOLS_SYSTEM_TEMPLATE = PERSONA_TEMPLATE + """
+{context_block}
+
+{cold_start_instruction}"""
+
+_prompt: Optional["PromptTemplate"] = None
+_tools_prompt: Optional["ChatPromptTemplate"] = None
+
+
+def _get_prompt() -> "PromptTemplate":
+    global _prompt
+    if _prompt is None:
+        from langchain_core.prompts import PromptTemplate
+        _prompt = PromptTemplate.from_template(REACT_TEMPLATE)
+    return _prompt
+
+
+def _get_tools_prompt() -> "ChatPromptTemplate":
+    global _tools_prompt
+    if _tools_prompt is None:
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+        _tools_prompt = ChatPromptTemplate.from_messages([
+            ("system", TOOLS_SYSTEM_TEMPLATE),
+            ("human", "{input}"),
+            MessagesPlaceholder("agent_scratchpad"),
+        ])
+    return _tools_prompt
+
+
+def __getattr__(name: str):
+    # Keep agent.TOOLS / agent.REACT_PROMPT working without importing
+    # LangChain when the module itself is imported.
+    if name == "TOOLS":
+        return _get_tools()
+    if name == "REACT_PROMPT":
+        return _get_prompt()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Built once per process (per mode): the prompt graph, tool rendering and
+# runnable chain are identical for every message. Per-message context
+# travels as input variables (user_name, context_block, cold_start_instruction).
+_executors: Dict[str, "AgentExecutor"] = {}
+_executor_lock = threading.Lock()
+
+
+def _get_executor(mode: Optional[str] = None) -> "AgentExecutor":
+    mode = mode or AGENT_MODE
+    executor = _executors.get(mode)
+    if executor is None:
+        if mode not in AGENT_MODES:
+            raise ValueError(f"AGENT_MODE must be one of {AGENT_MODES}, not {mode!r}")
+        with _executor_lock:
+            executor = _executors.get(mode)
+            if executor is None:
+                from langchain.agents import AgentExecutor, create_react_agent, create_tool_calling_agent
+                if mode == "tools":
+                    agent = create_tool_calling_agent(_get_llm(), _get_tools(), _get_tools_prompt())
+                else:
+                    agent = create_react_agent(_get_llm(), _get_tools(), _get_prompt())
+                executor = _executors[mode] = AgentExecutor(
+                    agent=agent,
+                    tools=_get_tools(),
+                    verbose=False,
+                    handle_parsing_errors=True,
+                    max_iterations=5,
+                )
+    return executor
+
+
+def _tracer(timings: Optional[Dict[str, float]]) -> "AgentTracer":
+    from tracing import AgentTracer
+    return AgentTracer(timings)
+
+
+def warm_up() -> None:
+    """Import LangChain, build the agent and open memory before the first request."""
+    _get_executor()
+    memory_warm_up()
+    router.warm_up(_TOOL_DESCRIPTIONS)
+
+
+def _context_inputs(
+    user_name: str, history, related, summary, session_id: str = "default",
+) -> Dict[str, str]:
+    """Render the per-message prompt variables."""
     # Build context block
-    context_block = format_history_for_prompt(
-        history, semantic_results, summary, user_name,
-    )
+    context_block = assemble_context(history, related, summary, user_name, session_id)
 
     # Cold-start instruction
     cold_start = ""
@@ -162,46 +315,466 @@ def _build_agent(user_message: str):
             f"and asking about their top 3 priorities or what they're working on right now."
         )
 
-    # Bind the dynamic context into the prompt via partial variables
-    prompt = REACT_PROMPT.partial(
-        user_name=user_name,
-        context_block=context_block,
-        cold_start_instruction=cold_start,
+    return {
+        "user_name": user_name,
+        "context_block": context_block,
+        "cold_start_instruction": cold_start,
+    }
+
+
+# Context lookups are independent, so they run concurrently. Each stage
+# has its own deadline; one that misses it contributes nothing rather than
+# holding up the LLM call.
+CONTEXT_DB_TIMEOUT = float(os.getenv("CONTEXT_DB_TIMEOUT", "1.0"))
+SEMANTIC_SEARCH_TIMEOUT = float(os.getenv("SEMANTIC_SEARCH_TIMEOUT", "1.5"))
+# Over-fetch: hits already in the recent window are dropped by assemble_context()
+RELATED_CANDIDATES = 6
+
+
+async def _context_stage(
+    name: str, aw: Awaitable[T], timeout: float, default: T, timings: Dict[str, float],
+) -> T:
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(aw, timeout)
+    except asyncio.TimeoutError:
+        metrics.incr(f"context.{name}.timeouts")
+        timings[f"context.{name}.timed_out"] = 1
+        return default
+    except Exception:
+        # Context is best-effort (e.g. a partition dropped by a concurrent
+        # clear_memory, an FTS error): answer without it, don't fail the turn
+        logger.exception("Context stage %r failed; continuing without it", name)
+        metrics.incr(f"context.{name}.errors")
+        timings[f"context.{name}.failed"] = 1
+        return default
+    finally:
+        metrics.observe(f"context.{name}", time.perf_counter() - start, timings)
+
+
+def _history_stage(session_id: str, timings: Dict[str, float]) -> Awaitable[List[Dict]]:
+    return _context_stage("history", aget_history(limit=10, session_id=session_id),
+                          CONTEXT_DB_TIMEOUT, [], timings)
+
+
+async def _agent_inputs(
+    user_message: str, timings: Optional[Dict[str, float]] = None,
+    history: Optional[Awaitable[List[Dict]]] = None,
+) -> Dict[str, str]:
+    """Gather context for this message and return the executor's input dict.
+
+    Pass `history` to share a history read that is already under way.
+    """
+    timings = {} if timings is None else timings
+    session_id = "default"
+
+    start = time.perf_counter()
+    user_name, history, related, summary = await asyncio.gather(
+        _context_stage("user_name", run_db(get_setting, "user_name", "there"),
+                       CONTEXT_DB_TIMEOUT, "there", timings),
+        history if history is not None else _history_stage(session_id, timings),
+        _context_stage("retrieval", ahybrid_search(user_message, n_results=RELATED_CANDIDATES, session_id=session_id),
+                       SEMANTIC_SEARCH_TIMEOUT, [], timings),
+        _context_stage("summary", run_db(get_summary_digest, session_id),
+                       CONTEXT_DB_TIMEOUT, [], timings),
+    )
+    wall = time.perf_counter() - start
+    metrics.observe("context.total", wall, timings)
+    # What running the stages back to back would have cost on top of this
+    stages = ("user_name", "history", "retrieval", "summary")
+    saved = sum(timings[f"context.{stage}"] for stage in stages) - wall
+    metrics.observe("context.saved", max(saved, 0.0), timings)
+
+    inputs = _context_inputs(user_name, history, related, summary, session_id)
+    inputs["input"] = user_message
+    return inputs
+
+
+# ── Response cache ────────────────────────────────────────────────
+#
+# Quick-action prompts (the buttons in app.py) are asked over and over. An
+# answer is cached under the normalised prompt and the session's memory
+# version; any new turn, priority or summary advances the version, so a
+# hit means nothing the agent could know has changed. Opt-in per class.
+
+QUICK_PROMPTS = {
+    "focus": "What should I focus on right now?",
+    "blockers": "What's currently blocking me?",
+    "priorities": "Summarize my current priorities",
+    "patterns": "What patterns do you notice in my work?",
+}
+# Off unless classes are listed, e.g. RESPONSE_CACHE_CLASSES=focus,priorities
+RESPONSE_CACHE_CLASSES = frozenset(
+    c.strip() for c in os.getenv("RESPONSE_CACHE_CLASSES", "").split(",") if c.strip()
+)
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+
+
+def _normalise_prompt(text: str) -> str:
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+
+_PROMPT_CLASSES = {_normalise_prompt(text): cls for cls, text in QUICK_PROMPTS.items()}
+
+
+def _response_cache_key(user_message: str) -> Optional[str]:
+    """Normalised prompt if its class is cacheable, else None."""
+    key = _normalise_prompt(user_message)
+    return key if _PROMPT_CLASSES.get(key) in RESPONSE_CACHE_CLASSES else None
+
+
+async def _cached_reply(prompt_key: str, session_id: str) -> Tuple[Optional[str], int]:
+    version = await run_db(get_memory_version, session_id)
+    reply = await run_db(
+        get_cached_response, session_id, prompt_key, version, RESPONSE_CACHE_TTL, time.time(),
     )
+    metrics.incr("response_cache.hits" if reply is not None else "response_cache.misses")
+    return reply, version
+
+
+async def _store_reply(
+    prompt_key: str, session_id: str, version_before: int, version_after: int, reply: str,
+) -> None:
+    # Only our own turn may have changed memory while the agent ran;
+    # otherwise the answer may not reflect version_after.
+    if version_after == version_before + 1:
+        await run_db(
+            put_cached_response, session_id, prompt_key, version_after, reply,
+            time.time(), RESPONSE_CACHE_MAX_ENTRIES,
+        )
+
+
+# ── Routing ───────────────────────────────────────────────────────
+#
+# router.py decides per message whether the ReAct loop is needed; "direct"
+# turns get one completion of DIRECT_TEMPLATE instead. Latency and LLM
+# calls are recorded per route (route.<name>.total / .llm_calls).
+
+_TOOL_DESCRIPTIONS = {fn.__name__: fn.__doc__ or "" for fn in _TOOL_FUNCTIONS}
 
-    agent = create_react_agent(_get_llm(), TOOLS, prompt)
-    return AgentExecutor(
-        agent=agent,
-        tools=TOOLS,
-        verbose=False,
-        handle_parsing_errors=True,
-        max_iterations=5,
+
+ROUTER_TIMEOUT = float(os.getenv("ROUTER_TIMEOUT", "0.5"))
+# Routing embeds one short message; on its own threads it never queues
+# behind retrieval on the Chroma executor.
+ROUTER_WORKERS = int(os.getenv("ROUTER_WORKERS", "2"))
+_router_executor = ThreadPoolExecutor(max_workers=ROUTER_WORKERS, thread_name_prefix="router")
+
+
+async def _classify(user_message: str, history: Awaitable[List[Dict]]) -> str:
+    # Shielded: a routing timeout must not cancel the read the context shares
+    recent = await asyncio.shield(history)
+    previous_reply = recent[-1]["agent_msg"] if recent else None
+    loop = asyncio.get_running_loop()
+    route, _ = await loop.run_in_executor(
+        _router_executor, router.route, user_message, _TOOL_DESCRIPTIONS, previous_reply,
     )
+    return route
+
+
+async def _route(user_message: str, timings: Optional[Dict[str, float]], history: Awaitable[List[Dict]]) -> str:
+    # The agent can handle anything the classifier cannot, or cannot in time
+    with metrics.span("chat.route", timings):
+        try:
+            route = await asyncio.wait_for(_classify(user_message, history), ROUTER_TIMEOUT)
+        except asyncio.TimeoutError:
+            metrics.incr("router.timeouts")
+            route = "agent"
+        except Exception:
+            route = "agent"
+    metrics.incr(f"router.{route}")
+    return route
+
+
+async def _inputs_and_route(
+    user_message: str, timings: Optional[Dict[str, float]],
+) -> Tuple[Dict[str, str], str]:
+    """Gather context and pick the route concurrently, reading history once."""
+    timings = {} if timings is None else timings
+    history = asyncio.ensure_future(_history_stage("default", timings))
+    return await asyncio.gather(
+        _agent_inputs(user_message, timings, history), _route(user_message, timings, history),
+    )
+
+
+def _record_route(route: str, tracer: "AgentTracer", seconds: float, timings: Optional[Dict[str, float]]) -> None:
+    # Up to the answer being complete; saving the turn is the same on both routes
+    metrics.observe(f"route.{route}.total", seconds, timings)
+    metrics.observe_count(f"route.{route}.llm_calls", tracer.llm_calls, timings)
+
+
+# ── Idempotency and single-flight ─────────────────────────────────
+#
+# Clients retry /chat on timeouts. A retry with the same Idempotency-Key
+# that arrives while the first try is still running joins it; one that
+# arrives after it finished is answered from the turn saved under its key,
+# for IDEMPOTENCY_TTL seconds. Calls without a key are separate turns,
+# even when their text is identical.
+
+class IdempotencyKeyReused(ValueError):
+    pass
+
+
+_in_flight: Dict[Tuple[str, str], Tuple[str, "asyncio.Future[str]"]] = {}  # (session, key) -> (message, run)
+
+
+def _land(flight: Tuple[str, str], task: "asyncio.Future[str]") -> None:
+    _in_flight.pop(flight, None)
+    if not task.cancelled():
+        task.exception()  # retrieved here, so a run whose callers all left is not logged as unhandled
+
+
+def _replay(stored: Dict[str, str], user_message: str, timings: Optional[Dict[str, float]]) -> str:
+    if stored["user_msg"] != user_message:
+        raise IdempotencyKeyReused("Idempotency-Key was already used for a different message")
+    metrics.incr("idempotency.replays")
+    if timings is not None:
+        timings["chat.replayed"] = 1
+    return stored["agent_msg"]
+
+
+# ── Sync bridge ───────────────────────────────────────────────────
+#
+# The Groq client pools keep-alive connections on the event loop that
+# opened them, so sync callers (Streamlit) share one long-lived loop in a
+# background thread instead of creating and closing a loop per call.
+
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    global _sync_loop
+    if _sync_loop is None:
+        with _sync_loop_lock:
+            if _sync_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="agent-loop", daemon=True).start()
+                _sync_loop = loop
+    return _sync_loop
+
+
+def _run_sync(coro: Awaitable[T]) -> T:
+    return asyncio.run_coroutine_threadsafe(coro, _get_sync_loop()).result()
+
+
+async def _next_token(tokens: AsyncIterator[str]) -> str:
+    return await tokens.__anext__()
 
 
 # ── Public interface ──────────────────────────────────────────────
 
 def run_agent(user_message: str) -> str:
-    """Non-streaming agent call. Used by FastAPI /chat endpoint."""
-    executor = _build_agent(user_message)
-    result = executor.invoke({"input": user_message})
-    reply = result["output"]
-    save_turn(user_message, reply)
+    """Non-streaming agent call for synchronous callers."""
+    return _run_sync(arun_agent(user_message))
+
+
+async def arun_agent(
+    user_message: str, timings: Optional[Dict[str, float]] = None, idempotency_key: Optional[str] = None,
+) -> str:
+    """Async agent call. Used by FastAPI /chat endpoint.
+
+    A call whose Idempotency-Key is already running waits for that run's reply.
+    """
+    session_id = "default"
+    if not idempotency_key:
+        return await _run_turn(user_message, session_id, None, timings)
+    flight = (session_id, idempotency_key)
+    running = _in_flight.get(flight)
+    if running is None:
+        task = asyncio.ensure_future(_run_turn(user_message, session_id, idempotency_key, timings))
+        _in_flight[flight] = (user_message, task)
+        task.add_done_callback(functools.partial(_land, flight))
+    else:
+        flight_message, task = running
+        if flight_message != user_message:
+            raise IdempotencyKeyReused("Idempotency-Key is in use for a different message")
+        metrics.incr("chat.coalesced")
+        if timings is not None:
+            timings["chat.coalesced"] = 1
+    # A caller that disconnects must not cancel the run the others wait on
+    return await asyncio.shield(task)
+
+
+async def _run_turn(
+    user_message: str, session_id: str, idempotency_key: Optional[str], timings: Optional[Dict[str, float]],
+) -> str:
+    start = time.perf_counter()
+    with metrics.span("chat.total", timings):
+        if idempotency_key:
+            stored = await run_db(get_idempotent_turn, idempotency_key, session_id)
+            if stored is not None:
+                return _replay(stored, user_message, timings)
+
+        prompt_key = _response_cache_key(user_message)
+        if prompt_key:
+            cached, version = await _cached_reply(prompt_key, session_id)
+            if cached is not None:
+                return cached
+
+        inputs, route = await _inputs_and_route(user_message, timings)
+        tracer = _tracer(timings)
+        with metrics.span("chat.agent", timings):  # LLM calls and tool runs
+            if route == "direct":
+                message = await _get_llm().ainvoke(DIRECT_TEMPLATE.format(**inputs), config={"callbacks": [tracer]})
+                reply = _chunk_text(message).strip()
+            else:
+                result = await _get_executor().ainvoke(inputs, config={"callbacks": [tracer]})
+                reply = result["output"]
+        tracer.finish()
+        _record_route(route, tracer, time.perf_counter() - start, timings)
+        with metrics.span("chat.save", timings):
+            try:
+                new_version = await asave_turn(user_message, reply, session_id, idempotency_key)
+            except sqlite3.IntegrityError:
+                # Another API worker saved this key while we ran; answer as it did
+                stored = idempotency_key and await run_db(get_idempotent_turn, idempotency_key, session_id)
+                if not stored:
+                    raise
+                return _replay(stored, user_message, timings)
+
+        if prompt_key:
+            await _store_reply(prompt_key, session_id, version, new_version, reply)
     return reply
 
 
-def stream_agent(user_message: str):
+# ── Token streaming ───────────────────────────────────────────────
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+
+class _FinalAnswerFilter:
+    """Pass through only the text after "Final Answer:" in one streamed LLM call.
+
+    Each ReAct iteration is a separate LLM run; Thought/Action turns never
+    contain the marker, so they are swallowed whole.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._open = False
+        self._started = False
+
+    def feed(self, token: str) -> str:
+        if not self._open:
+            self._buffer += token
+            idx = self._buffer.find(FINAL_ANSWER_MARKER)
+            if idx == -1:
+                return ""
+            self._open = True
+            token = self._buffer[idx + len(FINAL_ANSWER_MARKER):]
+            self._buffer = ""
+        if not self._started:
+            token = token.lstrip()
+            self._started = bool(token)
+        return token
+
+
+def _chunk_text(chunk) -> str:
+    # Chat models stream AIMessageChunk (.content); plain LLMs stream GenerationChunk (.text)
+    text = getattr(chunk, "content", None)
+    if text is None:
+        text = getattr(chunk, "text", "")
+    return text if isinstance(text, str) else ""
+
+
+async def astream_agent(
+    user_message: str, timings: Optional[Dict[str, float]] = None,
+) -> AsyncIterator[str]:
+    """Yield Final Answer tokens as the LLM produces them.
+
+    `chat.ttft` (first answer token) and `chat.total` are recorded in
+    metrics and, when given, in `timings`.
+    """
+    start = time.perf_counter()
+    session_id = "default"
+    prompt_key = _response_cache_key(user_message)
+    if prompt_key:
+        cached, version = await _cached_reply(prompt_key, session_id)
+        if cached is not None:
+            metrics.observe("chat.ttft", time.perf_counter() - start, timings)
+            yield cached
+            metrics.observe("chat.total", time.perf_counter() - start, timings)
+            return
+
+    inputs, route = await _inputs_and_route(user_message, timings)
+
+    filters: Dict[str, _FinalAnswerFilter] = {}
+    pending: Dict[str, List[str]] = {}  # tools mode: content per LLM run, until it ends
+    streamed = []
+    output = None
+
+    tracer = _tracer(timings)
+    agent_start = time.perf_counter()
+    mode = AGENT_MODE
+    if route == "direct":
+        # The whole completion is the answer: no Final Answer marker to find
+        async for chunk in _get_llm().astream(DIRECT_TEMPLATE.format(**inputs), config={"callbacks": [tracer]}):
+            delta = _chunk_text(chunk)
+            if not streamed:
+                delta = delta.lstrip()
+            if delta:
+                if not streamed:
+                    metrics.observe("chat.ttft", time.perf_counter() - start, timings)
+                streamed.append(delta)
+                yield delta
+    else:
+        async for event in _get_executor(mode).astream_events(
+            inputs, config={"callbacks": [tracer]}, version="v2",
+        ):
+            kind = event["event"]
+            delta = ""
+            if kind in ("on_chat_model_stream", "on_llm_stream"):
+                delta = _chunk_text(event["data"].get("chunk"))
+                if mode == "react":
+                    delta = filters.setdefault(event["run_id"], _FinalAnswerFilter()).feed(delta)
+                else:
+                    # A run may still end in tool calls, making its text a
+                    # preamble rather than the answer; hold it until then
+                    pending.setdefault(event["run_id"], []).append(delta)
+                    delta = ""
+            elif kind == "on_chat_model_end" and mode == "tools":
+                text = "".join(pending.pop(event["run_id"], []))
+                if not getattr(event["data"].get("output"), "tool_calls", None):
+                    delta = text if streamed else text.lstrip()
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                output = (event["data"].get("output") or {}).get("output")
+            if delta:
+                if not streamed:
+                    metrics.observe("chat.ttft", time.perf_counter() - start, timings)
+                streamed.append(delta)
+                yield delta
+
+    metrics.observe("chat.agent", time.perf_counter() - agent_start, timings)
+    tracer.finish()
+
+    # The executor's output covers parse-error fallbacks and iteration-limit
+    # stops that never emit a "Final Answer:" line.
+    reply = "".join(streamed).strip()
+    if output and not reply:
+        metrics.observe("chat.ttft", time.perf_counter() - start, timings)
+        yield output
+        reply = output
+    elif output and output != reply and output.startswith(reply):
+        yield output[len(reply):]
+        reply = output
+
+    _record_route(route, tracer, time.perf_counter() - start, timings)
+    with metrics.span("chat.save", timings):
+        new_version = await asave_turn(user_message, reply)
+    if prompt_key:
+        await _store_reply(prompt_key, session_id, version, new_version, reply)
+    metrics.observe("chat.total", time.perf_counter() - start, timings)
+
+
+def stream_agent(user_message: str) -> Iterator[str]:
     """Streaming agent call — yields text chunks. Used by Streamlit."""
-    executor = _build_agent(user_message)
-    full_reply = ""
-
-    for event in executor.stream({"input": user_message}):
-        if "output" in event:
-            chunk = event["output"]
-            if chunk:
-                delta = chunk[len(full_reply):]
-                full_reply = chunk
-                if delta:
-                    yield delta
-
-    save_turn(user_message, full_reply)
+    tokens = astream_agent(user_message)
+    try:
+        while True:
+            try:
+                yield _run_sync(_next_token(tokens))
+            except StopAsyncIteration:
+                break
+    finally:
+        _run_sync(tokens.aclose())
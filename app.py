@@ -1,10 +1,12 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import threading
+
 import streamlit as st
 from database import init_db, get_connection, get_setting, set_setting
 from memory import get_history, clear_memory
-from agent import stream_agent
+from agent import stream_agent, warm_up, QUICK_PROMPTS as QUICK_PROMPT_TEXT
 
 st.set_page_config(
     page_title="Sage AI",
@@ -293,6 +295,18 @@ def inject_theme(t: dict, mode: str) -> None:
 inject_theme(t, mode)
 init_db()
 
+
+@st.cache_resource
+def start_warm_up() -> threading.Thread:
+    # Once per process: load LangChain and the embedding model while the
+    # user is still reading the page rather than on their first message.
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+start_warm_up()
+
 user_name = get_setting("user_name")
 
 
@@ -426,10 +440,10 @@ st.markdown(f"""
 
 # ── Quick-action buttons ──────────────────────────────────────────────────────
 QUICK_PROMPTS = [
-    ("🎯 Focus",      "What should I focus on right now?"),
-    ("🚧 Blockers",   "What's currently blocking me?"),
-    ("📋 Priorities", "Summarize my current priorities"),
-    ("💡 Patterns",   "What patterns do you notice in my work?"),
+    ("🎯 Focus",      QUICK_PROMPT_TEXT["focus"]),
+    ("🚧 Blockers",   QUICK_PROMPT_TEXT["blockers"]),
+    ("📋 Priorities", QUICK_PROMPT_TEXT["priorities"]),
+    ("💡 Patterns",   QUICK_PROMPT_TEXT["patterns"]),
 ]
 
 triggered_prompt: str | None = None
@@ -0,0 +1,5 @@
+"""
+Offline benchmarks for the Focus Assistant's storage hot paths.
+
+Run a module directly, e.g. ``python -m benchmarks.db_pool``.
+"""
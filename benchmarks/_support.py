@@ -0,0 +1,79 @@
+"""
+Shared set-up for benchmarks: throwaway storage and offline embeddings.
+
+Import this module before database/memory/agent. It points DB_PATH and
+CHROMA_DIR at a temporary directory, because both are read at import time.
+"""
+
+import hashlib
+import math
+import os
+import re
+import tempfile
+from typing import List, Sequence
+
+_tmp = tempfile.TemporaryDirectory(prefix="focus-bench-")
+TMP_DIR = _tmp.name
+os.environ["DB_PATH"] = os.path.join(TMP_DIR, "bench.db")
+os.environ["CHROMA_DIR"] = os.path.join(TMP_DIR, "chroma")
+os.environ.setdefault("GROQ_API_KEY", "unused")
+
+EMBEDDING_DIM = 384
+
+
+class HashingEmbeddingFunction:
+    """Deterministic, network-free stand-in for MiniLM.
+
+    Words and character trigrams are hashed into a fixed-size vector and
+    L2-normalised. Texts that share vocabulary land close together, which
+    is enough to exercise HNSW realistically. The semantics are not real.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> int:
+        return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big") % self.dim
+
+    def __call__(self, input: Sequence[str]) -> List[List[float]]:
+        out = []
+        for text in input:
+            vec = [0.0] * self.dim
+            for word in re.findall(r"\w+", text.lower()):
+                vec[self._bucket(word)] += 1.0
+                padded = f" {word} "
+                for i in range(len(padded) - 2):
+                    vec[self._bucket(padded[i:i + 3])] += 0.25
+            norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+            out.append([v / norm for v in vec])
+        return out
+
+
+def use_offline_embeddings() -> None:
+    """Route embeddings.embed() through the hashing function."""
+    import embeddings
+    embeddings.EMBEDDING_MODEL_ID = "bench-hashing-384"
+    embeddings._embedder = HashingEmbeddingFunction()
+
+
+class CannedSummarizer:
+    """Answers summary prompts locally so background summary jobs need no LLM."""
+
+    class _Reply:
+        content = "- Keep shipping the current priorities\n- Watch for recurring blockers"
+
+    def invoke(self, prompt: str) -> "_Reply":
+        return self._Reply()
+
+
+def use_offline_summarizer() -> None:
+    """Point memory's summary worker at CannedSummarizer."""
+    import memory
+    memory._summarizer = CannedSummarizer()
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
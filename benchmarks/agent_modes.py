@@ -0,0 +1,93 @@
+"""
+ReAct text protocol vs native tool calling, on the stand-in LLM.
+
+Runs the same questions through agent.arun_agent() once per AGENT_MODE,
+in-process with MODEL_NAME=fake, and reports per turn: LLM calls
+(iterations), prompt and completion tokens, and latency. Half the
+questions mention priorities, so the fake model calls get_priorities
+before answering. The router is off, so every turn takes the agent path.
+--malformed-rate makes that share of ReAct replies unparseable, which is
+the retry the text protocol pays and tool calling does not.
+
+    python -m benchmarks.agent_modes --turns 40 --malformed-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+from typing import Dict, List
+
+from benchmarks import _support
+
+os.environ["MODEL_NAME"] = "fake"
+os.environ["ROUTER_MODE"] = "agent"
+
+import agent
+import fake_llm
+from database import init_db
+
+QUESTIONS = [
+    "What are my priorities this week?",
+    "I had a rough morning but the demo went fine.",
+    "Which priorities did I mention about the launch?",
+    "Can you help me plan tomorrow?",
+]
+
+
+async def _turn(mode: str, question: str) -> Dict[str, float]:
+    agent.AGENT_MODE = mode
+    timings: Dict[str, float] = {}
+    await agent.arun_agent(question, timings)
+    return {
+        "llm_calls": timings["chat.llm_calls"],
+        "input_tokens": timings["chat.input_tokens"],
+        "output_tokens": timings["chat.output_tokens"],
+        "ms": timings["chat.total"] * 1000,
+    }
+
+
+async def _main(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    _support.use_offline_embeddings()
+    _support.use_offline_summarizer()
+    init_db()
+    agent._llm = fake_llm.FakeReActChatModel(
+        latency=args.latency_ms / 1000, tokens_per_sec=0, reply_tokens=args.reply_tokens,
+        malformed_rate=args.malformed_rate,
+    )
+    for mode in agent.AGENT_MODES:  # warm-up: build executors, load memory
+        await _turn(mode, QUESTIONS[0])
+
+    # Interleave the modes so both see the same growing history
+    samples: Dict[str, List[Dict[str, float]]] = {mode: [] for mode in agent.AGENT_MODES}
+    for i in range(args.turns):
+        for mode in agent.AGENT_MODES:
+            samples[mode].append(await _turn(mode, QUESTIONS[i % len(QUESTIONS)]))
+    return {
+        mode: {name: statistics.mean(t[name] for t in turns) for name in turns[0]}
+        for mode, turns in samples.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=40, help="turns per mode")
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake time to first token")
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(_main(args))
+    print(f"turns={args.turns} per mode  malformed_rate={args.malformed_rate}  latency_ms={args.latency_ms}")
+    print(f"{'mode':8s} {'llm calls':>10s} {'in tokens':>10s} {'out tokens':>11s} {'mean ms':>9s}")
+    for mode, r in results.items():
+        print(f"{mode:8s} {r['llm_calls']:10.2f} {r['input_tokens']:10.0f} {r['output_tokens']:11.0f} {r['ms']:9.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
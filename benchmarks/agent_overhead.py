@@ -0,0 +1,89 @@
+"""
+Per-request agent overhead with the LLM taken out of the picture.
+
+A fake chat model answers instantly with a Final Answer, so the timing is
+pure LangChain work: "before" rebuilds the prompt partials, ReAct agent
+and AgentExecutor for every message (the old _build_agent), "after"
+reuses agent._get_executor() and passes the context as input variables.
+
+    python -m benchmarks.agent_overhead --requests 500
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("CHROMA_DIR", os.path.join(_tmp.name, "chroma"))
+os.environ.setdefault("DB_PATH", os.path.join(_tmp.name, "bench.db"))
+os.environ.setdefault("GROQ_API_KEY", "unused")
+
+from langchain.agents import AgentExecutor, create_react_agent
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import agent
+
+ANSWER = "Thought: I now have enough information to respond.\nFinal Answer: Noted."
+HISTORY = [
+    {"user_msg": f"Working on item {i}", "agent_msg": f"Got it, item {i}.", "created_at": "2024-01-01"}
+    for i in range(10)
+]
+
+
+def _before(llm, inputs):
+    prompt = agent.REACT_PROMPT.partial(
+        user_name=inputs["user_name"],
+        context_block=inputs["context_block"],
+        cold_start_instruction=inputs["cold_start_instruction"],
+    )
+    executor = AgentExecutor(
+        agent=create_react_agent(llm, agent.TOOLS, prompt),
+        tools=agent.TOOLS,
+        verbose=False,
+        handle_parsing_errors=True,
+        max_iterations=5,
+    )
+    return executor.invoke({"input": inputs["input"]})
+
+
+def _after(llm, inputs):
+    return agent._get_executor().invoke(inputs)
+
+
+def _measure(llm, inputs, requests: int):
+    # Interleave the two paths so GC pauses and CPU drift hit both equally
+    samples = {_before: [], _after: []}
+    for _ in range(requests):
+        for fn, out in samples.items():
+            start = time.perf_counter()
+            fn(llm, inputs)
+            out.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    llm = FakeListChatModel(responses=[ANSWER])
+    agent._llm = llm
+    inputs = agent._context_inputs("Sam", HISTORY, [], "- Ship the API refactor")
+    inputs["input"] = "What should I focus on right now?"
+
+    for fn in (_before, _after):  # warm-up
+        fn(llm, inputs)
+
+    samples_by_fn = _measure(llm, inputs, args.requests)
+    print(f"requests={args.requests}  (ms per request, LLM excluded)")
+    for label, fn in (("before (rebuild per message)", _before), ("after  (compiled once)", _after)):
+        samples = sorted(samples_by_fn[fn])
+        p50 = statistics.median(samples) * 1000
+        p99 = samples[int(len(samples) * 0.99) - 1] * 1000
+        print(f"{label:30s} p50={p50:7.3f}  p99={p99:7.3f}")
+
+
+if __name__ == "__main__":
+    main()
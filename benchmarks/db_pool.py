@@ -0,0 +1,95 @@
+"""
+Requests/sec for the SQLite work done by one /chat call, before and after
+connection pooling.
+
+Each simulated request runs the same statements as /chat: get_setting,
+get_history, get_latest_summary, the save_turn insert and get_turn_count.
+"before" opens a fresh default (rollback-journal) connection per helper,
+exactly as database.get_connection() used to; "after" uses the pool.
+
+    python -m benchmarks.db_pool --requests 2000 --threads 8
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+
+def _fresh_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(database.DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _chat_request(connect, i: int) -> None:
+    session_id = f"s{i % 16}"
+    with connect() as conn:
+        conn.execute("SELECT value FROM settings WHERE key = ?", ("user_name",)).fetchone()
+    with connect() as conn:
+        conn.execute(
+            "SELECT user_msg, agent_msg, created_at FROM conversations "
+            "WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, 10),
+        ).fetchall()
+    with connect() as conn:
+        conn.execute(
+            "SELECT summary FROM summaries WHERE session_id = ? ORDER BY id DESC LIMIT 1",
+            (session_id,),
+        ).fetchone()
+    with connect() as conn:
+        conn.execute(
+            "INSERT INTO conversations (user_msg, agent_msg, session_id) VALUES (?, ?, ?)",
+            (f"message {i}", f"reply {i}", session_id),
+        )
+        conn.commit()
+    with connect() as conn:
+        conn.execute(
+            "SELECT COUNT(*) as cnt FROM conversations WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+
+
+def _run(connect, requests: int, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: _chat_request(connect, i), range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def _fresh_db(tmp: str, name: str) -> None:
+    database.close_connections()
+    database.DB_PATH = os.path.join(tmp, name)
+    database.init_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # WAL is persistent, so put the baseline DB back into rollback-journal mode.
+        _fresh_db(tmp, "before.db")
+        database.close_connections()
+        with _fresh_connection() as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        before = _run(_fresh_connection, args.requests, args.threads)
+
+        _fresh_db(tmp, "after.db")
+        after = _run(database.get_connection, args.requests, args.threads)
+        database.close_connections()
+
+    print(f"requests={args.requests} threads={args.threads}")
+    print(f"before (connect per call): {before:10.1f} req/s")
+    print(f"after  (pooled, WAL):      {after:10.1f} req/s")
+    print(f"speed-up:                  {after / before:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Recall and latency of hybrid (BM25 + vector, RRF) vs vector-only retrieval.
+
+Seeds one session with filler turns plus "needle" turns that each mention
+a unique project code name and date, then asks exact-term questions
+("Where are we with Kestrel-417?") whose answer is a single needle.
+Embeddings come from the offline hashing stand-in, so absolute recall is
+not representative of MiniLM. The comparison shows what the keyword side
+adds for exact tokens.
+
+    python -m benchmarks.hybrid_recall --turns 5000 --needles 200 --k 3
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks import _support
+
+import database
+import memory
+
+TOPICS = [
+    "the API refactor", "demo prep", "quarterly planning", "hiring loop", "the onboarding docs",
+    "performance review", "the mobile release", "budget approval", "customer interviews",
+    "the data migration", "team offsite", "the design system", "incident follow-ups",
+]
+VERBS = ["worked on", "got blocked on", "made progress on", "need to revisit", "paired on", "reviewed"]
+CODE_NAMES = ["Kestrel", "Marlin", "Juniper", "Osprey", "Cobalt", "Tundra", "Saffron", "Quasar"]
+
+
+def _seed(turns: int, needles: int, rng: random.Random):
+    needle_at = set(rng.sample(range(turns), needles))
+    queries = []
+    for i in range(turns):
+        if i in needle_at:
+            name = f"{rng.choice(CODE_NAMES)}-{rng.randint(100, 999)}"
+            date = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            user = f"Deadline for {name} moved to {date}, it depends on {rng.choice(TOPICS)}."
+            queries.append((f"Where are we with {name}?", i))
+            queries.append((f"What is due on {date}?", i))
+        else:
+            user = f"Today I {rng.choice(VERBS)} {rng.choice(TOPICS)} and {rng.choice(TOPICS)}."
+        turn_id, _, _ = memory._insert_turn(user, "Noted.", "bench")
+        if i in needle_at:
+            queries[-1] = (queries[-1][0], f"conv_bench_{turn_id}")
+            queries[-2] = (queries[-2][0], f"conv_bench_{turn_id}")
+    memory.flush_embeddings("bench")
+    return queries
+
+
+def _evaluate(search, queries, k: int):
+    hits, samples = 0, []
+    for query, expected in queries:
+        start = time.perf_counter()
+        results = search(query, n_results=k, session_id="bench")
+        samples.append(time.perf_counter() - start)
+        hits += any(r["id"] == expected for r in results)
+    return hits / len(queries), samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--needles", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    _support.use_offline_embeddings()
+    database.init_db()
+    queries = _seed(args.turns, args.needles, random.Random(args.seed))
+
+    print(f"turns={args.turns} queries={len(queries)} k={args.k}")
+    for label, search in (("vector only", memory.semantic_search), ("hybrid (RRF)", memory.hybrid_search)):
+        _evaluate(search, queries[:20], args.k)  # warm caches
+        recall, samples = _evaluate(search, queries, args.k)
+        print(
+            f"{label:14s} recall@{args.k}={recall:6.3f}  "
+            f"p50={statistics.median(samples) * 1000:7.2f} ms  "
+            f"p99={_support.percentile(samples, 0.99) * 1000:7.2f} ms"
+        )
+    memory.stop_embedding_flusher()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Ramp concurrent /chat clients against the API to find where it saturates.
+
+Runs each concurrency level for a fixed time with a closed loop of clients
+(each sends its next message as soon as the last one returns). For each
+level it reports throughput, latency percentiles and the error rate,
+plus latency and LLM calls per turn on each router path (direct/agent).
+By default the FastAPI app runs in-process with MODEL_NAME=fake and
+offline embeddings, so Groq is never called and the mean time per stage
+(context gathering, agent/LLM, save) can be read from the app's metrics.
+With --url, a running server is targeted instead; start it with
+MODEL_NAME=fake. Stage timings then come from scraping its /metrics.
+
+    python -m benchmarks.load_test --levels 1,8,32,128 --duration 10
+    python -m benchmarks.load_test --url http://localhost:8081 --api-key $API_KEY
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter
+from contextlib import AsyncExitStack
+from typing import Dict, List
+
+import httpx
+
+from benchmarks import _support
+
+MESSAGES = [
+    "Today I worked on the API refactor and it went well.",
+    "I keep getting blocked on the data migration.",
+    "What are my priorities for this week?",
+    "I need to finish the demo prep before Friday.",
+    "Remind me of the priorities I saved about hiring.",
+    "Feeling scattered — too many meetings today.",
+    "Made progress on the onboarding docs this morning.",
+    "Budget approval is still stuck with finance.",
+    "Thanks, that helps!",
+]
+STAGES = [
+    ("context.total", "context (parallel)"),
+    ("context.history", "  history"),
+    ("context.retrieval", "  retrieval"),
+    ("context.summary", "  summary"),
+    ("chat.agent", "agent (LLM + tools)"),
+    ("chat.llm", "  LLM calls"),
+    ("chat.tools", "  tool calls"),
+    ("chat.save", "save turn"),
+    ("chat.total", "total"),
+]
+ROUTES = ("direct", "agent")  # see router.py
+SATURATION_GAIN = 1.10  # a level is saturated when throughput grows by less than this
+
+
+async def _client(http: httpx.AsyncClient, deadline: float, rng: random.Random,
+                  latencies: List[float], errors: Counter) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            resp = await http.post("/chat", json={"message": rng.choice(MESSAGES)})
+            if resp.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors[str(resp.status_code)] += 1
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] += 1
+
+
+async def _scrape_metrics(http: httpx.AsyncClient) -> Dict[str, Dict]:
+    """Stage sums/counts from a server's Prometheus /metrics, shaped like metrics.snapshot()."""
+    resp = await http.get("/metrics")
+    resp.raise_for_status()
+    values = {}
+    for line in resp.text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            values[name] = float(value)
+    names = [(name, "_seconds") for name, _ in STAGES]
+    for route in ROUTES:
+        names += [(f"route.{route}.total", "_seconds"), (f"route.{route}.llm_calls", "")]
+    out = {}
+    for name, suffix in names:
+        metric = "focus_assistant_" + name.replace(".", "_") + suffix
+        if metric + "_count" in values:
+            out[name] = {"count": values[metric + "_count"], "sum": values[metric + "_sum"]}
+    return out
+
+
+def _stage_means(before: Dict[str, Dict], after: Dict[str, Dict]) -> Dict[str, float]:
+    """Mean ms per call for each stage observed between two metrics snapshots."""
+    means = {}
+    for name, _ in STAGES:
+        new, old = after.get(name, {}), before.get(name, {})
+        calls = new.get("count", 0) - old.get("count", 0)
+        if calls:
+            means[name] = (new["sum"] - old.get("sum", 0.0)) / calls * 1000
+    return means
+
+
+def _route_stats(before: Dict[str, Dict], after: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Turns, mean latency and LLM calls per turn for each route between two snapshots."""
+    out = {}
+    for route in ROUTES:
+        def delta(name: str, field: str) -> float:
+            return after.get(name, {}).get(field, 0) - before.get(name, {}).get(field, 0)
+        turns = delta(f"route.{route}.total", "count")
+        if turns:
+            out[route] = {
+                "turns": int(turns),
+                "mean_ms": delta(f"route.{route}.total", "sum") / turns * 1000,
+                "llm_calls_per_turn": delta(f"route.{route}.llm_calls", "sum") / turns,
+            }
+    return out
+
+
+async def _run_level(http: httpx.AsyncClient, clients: int, duration: float, seed: int,
+                     snapshot) -> Dict:
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    before = await snapshot()
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        _client(http, deadline, random.Random(seed + i), latencies, errors) for i in range(clients)
+    ))
+    elapsed = time.perf_counter() - start
+    after = await snapshot()
+    total = len(latencies) + sum(errors.values())
+    return {
+        "clients": clients,
+        "requests": total,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": _support.percentile(latencies, 0.50) * 1000,
+        "p95_ms": _support.percentile(latencies, 0.95) * 1000,
+        "p99_ms": _support.percentile(latencies, 0.99) * 1000,
+        "error_rate": sum(errors.values()) / total if total else 0.0,
+        "errors": dict(errors),
+        "stages_ms": _stage_means(before, after),
+        "routes": _route_stats(before, after),
+    }
+
+
+def _print_level(r: Dict) -> None:
+    print(
+        f"clients={r['clients']:4d}  {r['throughput_rps']:8.1f} req/s  "
+        f"p50={r['p50_ms']:8.1f}  p95={r['p95_ms']:8.1f}  p99={r['p99_ms']:8.1f} ms  "
+        f"errors={r['error_rate'] * 100:5.1f}%" + (f" {r['errors']}" if r["errors"] else "")
+    )
+    for name, label in STAGES:
+        if name in r["stages_ms"]:
+            print(f"    {label:22s} {r['stages_ms'][name]:8.1f} ms")
+    for route, stats in r["routes"].items():
+        print(f"    route {route:16s} {stats['mean_ms']:8.1f} ms  {stats['turns']:5d} turns  "
+              f"{stats['llm_calls_per_turn']:.2f} LLM calls/turn")
+
+
+async def _main(args: argparse.Namespace) -> List[Dict]:
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with AsyncExitStack() as stack:
+        if args.url:
+            http = httpx.AsyncClient(base_url=args.url, headers=headers, timeout=args.timeout, limits=limits)
+        else:
+            import main as api
+            import metrics
+            await stack.enter_async_context(api.lifespan(api.app))
+            await asyncio.to_thread(api.warm_up)
+            http = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=api.app), base_url="http://load-test",
+                headers=headers, timeout=args.timeout,
+            )
+        await stack.enter_async_context(http)
+
+        async def snapshot() -> Dict[str, Dict]:
+            return await _scrape_metrics(http) if args.url else metrics.snapshot()
+
+        results = []
+        for clients in args.levels:
+            r = await _run_level(http, clients, args.duration, args.seed, snapshot)
+            _print_level(r)
+            if results and r["throughput_rps"] < results[-1]["throughput_rps"] * SATURATION_GAIN:
+                print(f"    ^ saturated: throughput grew <{(SATURATION_GAIN - 1) * 100:.0f}% "
+                      f"over {results[-1]['clients']} clients")
+            results.append(r)
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--levels", default="1,4,16,64", help="comma-separated concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY"))
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--latency-ms", type=float, help="fake LLM time to first token (in-process only)")
+    parser.add_argument("--tokens-per-sec", type=float, help="fake LLM token rate (in-process only)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    args.levels = [int(n) for n in args.levels.split(",") if n.strip()]
+
+    if not args.url:
+        # Read at import time by agent.py and fake_llm.py
+        os.environ["MODEL_NAME"] = "fake"
+        if args.latency_ms is not None:
+            os.environ["FAKE_LLM_LATENCY_MS"] = str(args.latency_ms)
+        if args.tokens_per_sec is not None:
+            os.environ["FAKE_LLM_TOKENS_PER_SEC"] = str(args.tokens_per_sec)
+        _support.use_offline_embeddings()
+
+    results = asyncio.run(_main(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"target": args.url or "in-process", "duration": args.duration, "levels": results}, f, indent=2)
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
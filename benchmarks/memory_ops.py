@@ -0,0 +1,176 @@
+"""
+Throughput and p50/p99 latency of the memory and database hot paths at
+realistic session sizes.
+
+For each size, one session is seeded with that many synthetic turns (plus
+a few priorities and a summary) in throwaway SQLite and Chroma
+directories. Then save_turn, get_history, semantic_search, hybrid_search,
+assemble_context and clear_memory are timed against it. Embeddings and
+summaries are produced locally, so no network is needed. Results are
+printed and written as JSON, so two commits can be compared:
+
+    python -m benchmarks.memory_ops --sizes 1000,10000,100000 --output before.json
+    python -m benchmarks.memory_ops --sizes 1000,10000,100000 --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+from typing import Callable, Dict, List
+
+from benchmarks import _support
+
+import database
+import memory
+
+TOPICS = [
+    "the API refactor", "demo prep", "quarterly planning", "hiring loop", "the onboarding docs",
+    "performance review", "the mobile release", "budget approval", "customer interviews",
+    "the data migration", "team offsite", "the design system", "incident follow-ups",
+]
+VERBS = ["worked on", "got blocked on", "made progress on", "need to revisit", "paired on", "reviewed"]
+REPLIES = [
+    "Noted — want me to save that as a priority?",
+    "That sounds like the main blocker this week.",
+    "Good progress. What is the next concrete step?",
+    "You mentioned this before; it keeps coming up.",
+]
+SEED_BATCH_SIZE = 512  # embedding batch while seeding; the live default is smaller
+
+
+def _message(rng: random.Random) -> str:
+    return f"Today I {rng.choice(VERBS)} {rng.choice(TOPICS)} and {rng.choice(TOPICS)}."
+
+
+def _query(rng: random.Random, i: int) -> str:
+    # The trailing number keeps queries distinct, so the embedding cache
+    # does not turn every search after the first into a hit.
+    return f"How is {rng.choice(TOPICS)} going? ({i})"
+
+
+def _seed(session_id: str, turns: int, rng: random.Random) -> float:
+    start = time.perf_counter()
+    for _ in range(turns):
+        memory._insert_turn(_message(rng), rng.choice(REPLIES), session_id)
+    for topic in TOPICS[:5]:
+        memory.store_priority(f"Finish {topic} this month", session_id)
+    database.save_summary(session_id, _support.CannedSummarizer._Reply.content, turns)
+
+    memory.flush_embeddings(session_id, batch_size=SEED_BATCH_SIZE)
+    return time.perf_counter() - start
+
+
+def _measure(fn: Callable[[int], object], iterations: int) -> Dict[str, float]:
+    samples: List[float] = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    total = sum(samples)
+    return {
+        "n": iterations,
+        "ops_per_sec": iterations / total if total else 0.0,
+        "p50_ms": _support.percentile(samples, 0.50) * 1000,
+        "p99_ms": _support.percentile(samples, 0.99) * 1000,
+    }
+
+
+def _run_size(turns: int, iterations: int, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    session_id = f"bench_{turns}"
+    seed_seconds = _seed(session_id, turns, rng)
+    print(f"\nturns={turns}  (seeded in {seed_seconds:.1f} s)")
+
+    history = memory.get_history(limit=10, session_id=session_id)
+    related = memory.hybrid_search(_query(rng, -1), n_results=memory.HYBRID_CANDIDATES, session_id=session_id)
+    summary = database.get_summary_digest(session_id)
+
+    ops = {
+        "get_history": lambda i: memory.get_history(limit=10, session_id=session_id),
+        "semantic_search": lambda i: memory.semantic_search(_query(rng, i), n_results=3, session_id=session_id),
+        "hybrid_search": lambda i: memory.hybrid_search(_query(rng, i), n_results=3, session_id=session_id),
+        "assemble_context": lambda i: memory.assemble_context(history, related, summary, "Sam", session_id),
+        "save_turn": lambda i: memory.save_turn(_message(rng), rng.choice(REPLIES), session_id),
+    }
+    results = {}
+    for name, fn in ops.items():
+        _measure(fn, min(10, iterations))  # warm caches and the partition handle
+        results[name] = _measure(fn, iterations)
+    # One wipe per size: it empties the session, so there is nothing to repeat.
+    results["clear_memory"] = _measure(lambda i: memory.clear_memory(session_id), 1)
+
+    for name, r in results.items():
+        print(
+            f"  {name:17s} n={r['n']:5d}  {r['ops_per_sec']:9.1f} ops/s  "
+            f"p50={r['p50_ms']:8.3f} ms  p99={r['p99_ms']:8.3f} ms"
+        )
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+        )
+        return out.stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def _compare(current: Dict, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline.get('commit', '?')}): p50 / p99 change")
+    matched = 0
+    for size, ops in current["results"].items():
+        for name, r in ops.items():
+            old = baseline.get("results", {}).get(size, {}).get(name)
+            if not old or not old["p50_ms"] or not old["p99_ms"]:
+                continue
+            matched += 1
+            print(
+                f"  {size:>7s} {name:17s} "
+                f"{(r['p50_ms'] / old['p50_ms'] - 1) * 100:+7.1f}%  "
+                f"{(r['p99_ms'] / old['p99_ms'] - 1) * 100:+7.1f}%"
+            )
+    if not matched:
+        print("  no sizes in common with the baseline")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated turns per session")
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per operation")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="memory_ops.json", help="where to write JSON results")
+    parser.add_argument("--compare", help="earlier --output file to diff against")
+    args = parser.parse_args()
+
+    _support.use_offline_embeddings()
+    _support.use_offline_summarizer()
+    database.init_db()
+    rng = random.Random(args.seed)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "iterations": args.iterations,
+        "results": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        report["results"][str(size)] = _run_size(size, args.iterations, rng)
+
+    memory.stop_summary_worker()
+    memory.stop_embedding_flusher()
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {args.output}")
+    if args.compare:
+        _compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Bulk import/export of a session's memory as NDJSON.
+
+One JSON object per line, tagged by "type":
+
+    {"type": "turn", "user_msg": "...", "agent_msg": "...", "created_at": "2024-05-01 09:30:00"}
+    {"type": "priority", "text": "...", "status": "active", "created_at": "..."}
+    {"type": "summary", "summary": "...", "turn_count": 20, "created_at": "..."}
+    {"type": "archived_turn", "user_msg": "...", "agent_msg": "...", "created_at": "...", "archived_at": "..."}
+
+A priority's "status" is active, done or dropped; an "active" boolean is
+accepted in its place. Summaries may also carry "level" (0 = rolling
+snapshot, higher = rollups; see memory._rollup), or "kind": "archive" and
+"last_turn_id" when they stand in for turns folded away by retention.py;
+archived_turn records are the raw turns it kept in conversations_archive.
+created_at is optional on import (defaults to now) and accepts any ISO 8601
+timestamp; offsets are converted to UTC. GET /export produces the same
+format, so an export can be imported elsewhere as-is.
+
+Uploads are spooled to IMPORT_DIR and a background worker writes them in
+IMPORT_BATCH_SIZE-line transactions with executemany, then embeds each
+batch. The job's byte offset commits with its rows, so an interrupted
+import resumes from the last committed batch. Exports page through SQLite
+by id, so memory use does not grow with the session.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import memory
+from database import (
+    get_connection, run_db, enqueue_embeddings, get_export_page,
+    create_import_job, claim_import_job, record_import_progress,
+    complete_import_job, fail_import_job,
+)
+
+IMPORT_DIR = os.getenv("IMPORT_DIR", "./imports")
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(1024 * 1024 * 1024)))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))  # lines per transaction
+IMPORT_EMBED_BATCH_SIZE = int(os.getenv("IMPORT_EMBED_BATCH_SIZE", "256"))
+IMPORT_MAX_ATTEMPTS = 5
+IMPORT_RETRY_BASE = 5.0
+IMPORT_LEASE_SECONDS = 300.0
+IMPORT_POLL_INTERVAL = 5.0
+EXPORT_PAGE_SIZE = 500
+
+
+class ImportTooLarge(ValueError):
+    pass
+
+
+# ── Parsing ───────────────────────────────────────────────────────
+
+def _text(record: Dict, field: str) -> str:
+    value = record.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{field!r} must be a non-empty string")
+    return value
+
+
+def _timestamp(record: Dict, field: str) -> Optional[str]:
+    """ISO 8601 -> SQLite's "YYYY-MM-DD HH:MM:SS" in UTC, so ordering and date() work."""
+    value = record.get(field)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{field!r} must be a string")
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{field!r} is not an ISO 8601 timestamp: {value!r}") from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _parse(raw: bytes) -> Tuple[str, tuple]:
+    """One NDJSON line -> (kind, insert values); ValueError if malformed."""
+    record = json.loads(raw)
+    if not isinstance(record, dict):
+        raise ValueError("expected a JSON object")
+    created_at = _timestamp(record, "created_at")
+
+    kind = record.get("type")
+    if kind == "turn":
+        return kind, (_text(record, "user_msg"), _text(record, "agent_msg"), created_at)
+    if kind == "archived_turn":
+        return kind, (_text(record, "user_msg"), _text(record, "agent_msg"), created_at,
+                      _timestamp(record, "archived_at"))
+    if kind == "priority":
+        status = record.get("status", "active" if record.get("active", True) else "dropped")
+        if status not in memory.PRIORITY_STATUSES:
+            raise ValueError(f"'status' must be one of {memory.PRIORITY_STATUSES}")
+        return kind, (_text(record, "text"), status, created_at)
+    if kind == "summary":
+        turn_count = record.get("turn_count")
+        if not isinstance(turn_count, int) or isinstance(turn_count, bool):
+            raise ValueError("'turn_count' must be an integer")
+        summary_kind = record.get("kind", "snapshot")
+        last_turn_id = record.get("last_turn_id")
+        if summary_kind not in ("snapshot", "archive"):
+            raise ValueError("'kind' must be 'snapshot' or 'archive'")
+        if summary_kind == "archive" and not isinstance(last_turn_id, int):
+            raise ValueError("archive summaries need an integer 'last_turn_id'")
+        level = record.get("level", 0)
+        if not isinstance(level, int) or isinstance(level, bool) or level < 0:
+            raise ValueError("'level' must be a non-negative integer")
+        return kind, (_text(record, "summary"), turn_count, summary_kind, level, last_turn_id, created_at)
+    raise ValueError(f"unknown type {kind!r}")
+
+
+# ── Import ────────────────────────────────────────────────────────
+
+async def spool_import(chunks: AsyncIterator[bytes], session_id: str = "default") -> Dict:
+    """Write an upload to IMPORT_DIR and queue it; returns the job row."""
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_DIR, f"{uuid.uuid4().hex}.ndjson")
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > IMPORT_MAX_BYTES:
+                    raise ImportTooLarge(f"Import exceeds {IMPORT_MAX_BYTES} bytes")
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    job = await run_db(create_import_job, session_id, path, size)
+    start_import_worker()
+    _import_wakeup.set()
+    return job
+
+
+def _write_batch(
+    job: Dict, turns: List[tuple], priorities: List[tuple], summaries: List[tuple],
+    archived: List[tuple],
+) -> None:
+    """Insert one batch, queue its embeddings and advance the job, atomically."""
+    session_id = job["session_id"]
+    docs = []
+    conn = get_connection()
+    # IMMEDIATE takes the write lock up front, so every id above the
+    # current maximum belongs to this batch.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if turns:
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM conversations").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO conversations (user_msg, agent_msg, session_id, created_at) "
+                "VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+                [(user_msg, agent_msg, session_id, created_at) for user_msg, agent_msg, created_at in turns],
+            )
+            rows = conn.execute(
+                "SELECT id, user_msg, agent_msg FROM conversations WHERE session_id = ? AND id > ? ORDER BY id",
+                (session_id, last_id),
+            )
+            docs += [memory._turn_doc(session_id, r["id"], r["user_msg"], r["agent_msg"]) for r in rows]
+        if priorities:
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM priorities").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO priorities (text, status, active, session_id, created_at) "
+                "VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+                [(text, status, 1 if status == "active" else 0, session_id, created_at)
+                 for text, status, created_at in priorities],
+            )
+            # Closed priorities are kept but not searchable, as in set_priority_status()
+            rows = conn.execute(
+                "SELECT id, text FROM priorities WHERE session_id = ? AND id > ? AND active = 1 ORDER BY id",
+                (session_id, last_id),
+            )
+            docs += [memory._priority_doc(session_id, r["id"], r["text"]) for r in rows]
+        if summaries:
+            conn.executemany(
+                "INSERT INTO summaries (summary, turn_count, kind, level, last_turn_id, session_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+                [(summary, turn_count, summary_kind, level, last_turn_id, session_id, created_at)
+                 for summary, turn_count, summary_kind, level, last_turn_id, created_at in summaries],
+            )
+            docs += [
+                memory._archive_doc(session_id, last_turn_id, summary) if summary_kind == "archive"
+                else memory._summary_doc(session_id, turn_count, summary, level)
+                for summary, turn_count, summary_kind, level, last_turn_id, _ in summaries
+            ]
+
+        if archived:
+            # Archive rows keep the id their turn had in conversations, so
+            # take fresh ids from that table's sequence; a later retention
+            # pass can then never collide with them.
+            seq = conn.execute(
+                "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'conversations'), 0), "
+                "COALESCE((SELECT MAX(id) FROM conversations_archive), 0))"
+            ).fetchone()[0]
+            conn.executemany(
+                "INSERT INTO conversations_archive (id, user_msg, agent_msg, session_id, created_at, archived_at) "
+                "VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+                [(seq + i, user_msg, agent_msg, session_id, created_at, archived_at)
+                 for i, (user_msg, agent_msg, created_at, archived_at) in enumerate(archived, 1)],
+            )
+            seq += len(archived)
+            if not conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'conversations'", (seq,)).rowcount:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('conversations', ?)", (seq,))
+
+        enqueue_embeddings(conn, docs)
+        job["turns"] += len(turns) + len(archived)
+        job["priorities"] += len(priorities)
+        job["summaries"] += len(summaries)
+        record_import_progress(conn, job, time.time() + IMPORT_LEASE_SECONDS)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _import_file(job: Dict) -> None:
+    with open(job["path"], "rb") as f:
+        f.seek(job["byte_offset"])
+        while not _import_stop.is_set():
+            batch: Dict[str, List[tuple]] = {"turn": [], "priority": [], "summary": [], "archived_turn": []}
+            read = 0
+            while read < IMPORT_BATCH_SIZE:
+                raw = f.readline()
+                if not raw:
+                    break
+                read += 1
+                job["lines"] += 1
+                if not raw.strip():
+                    continue
+                try:
+                    kind, values = _parse(raw)
+                except ValueError as e:
+                    job["skipped"] += 1
+                    job["last_error"] = f"line {job['lines']}: {e}"
+                    continue
+                batch[kind].append(values)
+            if not read:
+                return
+            job["byte_offset"] = f.tell()
+            _write_batch(job, batch["turn"], batch["priority"], batch["summary"], batch["archived_turn"])
+            memory.flush_embeddings(job["session_id"], batch_size=IMPORT_EMBED_BATCH_SIZE)
+
+
+def _run_import_job(job: Dict) -> None:
+    try:
+        _import_file(job)
+    except Exception as e:
+        retry_at = None
+        if job["attempts"] < IMPORT_MAX_ATTEMPTS:
+            retry_at = time.time() + IMPORT_RETRY_BASE * 2 ** (job["attempts"] - 1)
+        fail_import_job(job["id"], str(e), retry_at)
+        return
+    if _import_stop.is_set():
+        # Shutting down mid-file: hand the job back so the next start resumes it
+        fail_import_job(job["id"], "interrupted by shutdown", time.time())
+        return
+    complete_import_job(job["id"])
+    try:
+        os.remove(job["path"])
+    except OSError:
+        pass
+
+
+# ── Background import worker ──────────────────────────────────────
+#
+# Same shape as the summary worker: one daemon thread claims jobs with a
+# lease, so a job whose process died is picked up again once it expires.
+
+_import_wakeup = threading.Event()
+_import_stop = threading.Event()
+_import_thread: Optional[threading.Thread] = None
+_import_thread_lock = threading.Lock()
+
+
+def _import_worker_loop() -> None:
+    while not _import_stop.is_set():
+        try:
+            job = claim_import_job(time.time(), IMPORT_LEASE_SECONDS)
+        except Exception:
+            job = None  # DB briefly locked or unavailable — try again after the poll
+        if job is None:
+            _import_wakeup.wait(IMPORT_POLL_INTERVAL)
+            _import_wakeup.clear()
+            continue
+        _run_import_job(job)
+
+
+def start_import_worker() -> None:
+    """Start the import worker if this process has none yet."""
+    global _import_thread
+    if _import_thread is not None and _import_thread.is_alive():
+        return
+    with _import_thread_lock:
+        if _import_thread is None or not _import_thread.is_alive():
+            _import_stop.clear()
+            _import_thread = threading.Thread(target=_import_worker_loop, name="import-worker", daemon=True)
+            _import_thread.start()
+
+
+def stop_import_worker(timeout: float = 5.0) -> None:
+    """Stop after the current batch; an unfinished job resumes on next start."""
+    global _import_thread
+    _import_stop.set()
+    _import_wakeup.set()
+    with _import_thread_lock:
+        if _import_thread is not None:
+            _import_thread.join(timeout)
+            _import_thread = None
+
+
+# ── Export ────────────────────────────────────────────────────────
+
+_EXPORT_FIELDS = {
+    "turn": ("user_msg", "agent_msg", "created_at"),
+    "priority": ("text", "active", "status", "created_at"),
+    "summary": ("summary", "turn_count", "kind", "level", "last_turn_id", "created_at"),
+    "archived_turn": ("user_msg", "agent_msg", "created_at", "archived_at"),
+}
+
+
+async def export_ndjson(session_id: str = "default") -> AsyncIterator[bytes]:
+    """Yield the session as NDJSON, one page of rows per chunk."""
+    for kind, fields in _EXPORT_FIELDS.items():
+        after_id = 0
+        while True:
+            rows = await run_db(get_export_page, kind, session_id, after_id, EXPORT_PAGE_SIZE)
+            if not rows:
+                break
+            lines = []
+            for row in rows:
+                record = {"type": kind, **{f: row[f] for f in fields}}
+                if kind == "priority":
+                    record["active"] = bool(record["active"])
+                lines.append(json.dumps(record) + "\n")
+            yield "".join(lines).encode("utf-8")
+            after_id = rows[-1]["id"]
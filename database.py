@@ -1,59 +1,667 @@
+import asyncio
+import functools
+import json
+import re
 import sqlite3
 import os
-from typing import List, Dict, Optional
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple, TypeVar
+
+import metrics
+
+T = TypeVar("T")
 
 DB_PATH = os.getenv("DB_PATH", "focus_assistant.db")
 
+# ── Connection pool ───────────────────────────────────────────────
+#
+# One connection per (thread, database file), closed when its thread exits.
+# Reusing the connection keeps sqlite3's per-connection statement cache
+# warm, so the handful of fixed queries below are prepared once per thread
+# instead of once per call. WAL lets readers proceed while a writer commits.
 
-def get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool: set = set()  # open connections of live threads, for close_connections()
+_pool_generation = 0
+
+
+class _ThreadConnections:
+    """One thread's connections; closed when the thread (and its locals) go away.
+
+    Worker threads come and go (anyio retires idle ones, to_thread spawns
+    more), so a connection must not outlive the thread that owns it.
+    """
+
+    def __init__(self):
+        self.conns: Dict[str, sqlite3.Connection] = {}
+        self.generation = _pool_generation
+        weakref.finalize(self, _close_thread_connections, self.conns)
+
+
+def _close_thread_connections(conns: Dict[str, sqlite3.Connection]) -> None:
+    with _pool_lock:
+        _pool.difference_update(conns.values())
+    for conn in conns.values():
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        path,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,  # only the owning thread uses it; close_connections() may run elsewhere
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
     return conn
 
 
-def init_db() -> None:
-    with get_connection() as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS conversations (
-                id         INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_msg   TEXT    NOT NULL,
-                agent_msg  TEXT    NOT NULL,
-                session_id TEXT    DEFAULT 'default',
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS settings (
-                key   TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS priorities (
-                id         INTEGER PRIMARY KEY AUTOINCREMENT,
-                text       TEXT    NOT NULL,
-                session_id TEXT    DEFAULT 'default',
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                active     BOOLEAN DEFAULT 1
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS summaries (
-                id         INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT    DEFAULT 'default',
-                summary    TEXT    NOT NULL,
-                turn_count INTEGER NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        conn.commit()
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's pooled connection to DB_PATH.
+
+    Use it as ``with get_connection() as conn:`` — the block commits on
+    success and rolls back on error, but leaves the connection open for
+    the next caller on the same thread.
+    """
+    held = getattr(_local, "held", None)
+    if held is None or held.generation != _pool_generation:
+        held = _local.held = _ThreadConnections()
+
+    conn = held.conns.get(DB_PATH)
+    if conn is None:
+        conn = held.conns[DB_PATH] = _connect(DB_PATH)
+        with _pool_lock:
+            _pool.add(conn)
+    return conn
+
+
+# Async callers hop onto a small dedicated pool so SQLite work never
+# competes with the event loop or Starlette's threadpool. Each worker
+# thread keeps its own pooled connection.
+
+DB_WORKERS = int(os.getenv("DB_WORKERS", "4"))
+_db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="sqlite")
 
-        # Migrate existing conversations table — add session_id if missing
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Await a blocking database helper on the dedicated SQLite executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(fn, *args, **kwargs))
+
+
+def iter_rows(sql: str, params: tuple = (), batch_size: int = 500) -> Iterator[Dict]:
+    """Stream a query's rows without materialising them all.
+
+    Uses a private connection rather than the pool: the generator may be
+    resumed on different threads (e.g. a StreamingResponse), and its open
+    cursor must not share a connection with anything else.
+    """
+    conn = _connect(DB_PATH)
+    try:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+
+def close_connections() -> None:
+    """Close every pooled connection (e.g. on shutdown or after DB_PATH changes)."""
+    global _pool_generation
+    with _pool_lock:
+        _pool_generation += 1
+        conns = list(_pool)
+        _pool.clear()
+    for conn in conns:
         try:
-            conn.execute("ALTER TABLE conversations ADD COLUMN session_id TEXT DEFAULT 'default'")
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+# ── Schema migrations ─────────────────────────────────────────────
+#
+# MIGRATIONS[i] upgrades the schema from version i to i + 1. The current
+# version is stored in SQLite's user_version header, so init_db() only
+# runs the steps a given database file has not seen yet.
+
+def _migrate_base_tables(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_msg   TEXT    NOT NULL,
+            agent_msg  TEXT    NOT NULL,
+            session_id TEXT    DEFAULT 'default',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            key   TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS priorities (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            text       TEXT    NOT NULL,
+            session_id TEXT    DEFAULT 'default',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            active     BOOLEAN DEFAULT 1
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS summaries (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT    DEFAULT 'default',
+            summary    TEXT    NOT NULL,
+            turn_count INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Pre-versioning databases may lack conversations.session_id
+    try:
+        conn.execute("ALTER TABLE conversations ADD COLUMN session_id TEXT DEFAULT 'default'")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+
+def _migrate_indexes_and_turn_counter(conn: sqlite3.Connection) -> None:
+    # One index per access path: get_history, get_all_priorities, get_latest_summary
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_conversations_session_id "
+        "ON conversations (session_id, id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_priorities_session_created "
+        "ON priorities (session_id, created_at)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_summaries_session_id "
+        "ON summaries (session_id, id)"
+    )
+
+    # Monotonic per-session turn counter, bumped in the same transaction as
+    # the conversation insert. Only clear_memory() resets it.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS session_counters (
+            session_id TEXT    PRIMARY KEY,
+            turn_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_conversations_count
+        AFTER INSERT ON conversations
+        BEGIN
+            INSERT INTO session_counters (session_id, turn_count)
+            VALUES (COALESCE(NEW.session_id, 'default'), 1)
+            ON CONFLICT(session_id) DO UPDATE SET turn_count = turn_count + 1;
+        END
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO session_counters (session_id, turn_count)
+        SELECT COALESCE(session_id, 'default'), COUNT(*)
+        FROM conversations GROUP BY COALESCE(session_id, 'default')
+    """)
+
+
+def _migrate_summary_jobs(conn: sqlite3.Connection) -> None:
+    # Durable queue for background summarisation. UNIQUE(session_id, turn_count)
+    # de-duplicates enqueues; run_after doubles as retry delay and claim lease.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS summary_jobs (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT    NOT NULL,
+            turn_count INTEGER NOT NULL,
+            status     TEXT    NOT NULL DEFAULT 'pending',
+            attempts   INTEGER NOT NULL DEFAULT 0,
+            run_after  REAL    NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (session_id, turn_count)
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_summary_jobs_status "
+        "ON summary_jobs (status, run_after)"
+    )
+
+
+def _migrate_embedding_queue(conn: sqlite3.Connection) -> None:
+    # Write-behind buffer for ChromaDB: rows are queued in the same
+    # transaction as the data they describe and removed once embedded.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_queue (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            doc_id     TEXT    NOT NULL UNIQUE,
+            session_id TEXT    NOT NULL,
+            document   TEXT    NOT NULL,
+            metadata   TEXT    NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_embedding_queue_session "
+        "ON embedding_queue (session_id, id)"
+    )
+
+
+def _migrate_embedding_cache(conn: sqlite3.Connection) -> None:
+    # On-disk tier of the embedding cache: float32 vectors keyed by
+    # sha256(model id + text)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            key    TEXT PRIMARY KEY,
+            vector BLOB NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+
+# rowid = source id * 3 + kind (0 conversation, 1 priority, 2 summary), so
+# the delete/update triggers are primary-key lookups on memory_fts.
+_FTS_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_conversations_fts_insert
+    AFTER INSERT ON conversations BEGIN
+        INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+        VALUES (NEW.id * 3,
+                'User: ' || NEW.user_msg || char(10) || 'Assistant: ' || NEW.agent_msg,
+                NEW.session_id, 'conv_' || NEW.session_id || '_' || NEW.id, 'conversation');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_conversations_fts_delete
+    AFTER DELETE ON conversations BEGIN
+        DELETE FROM memory_fts WHERE rowid = OLD.id * 3;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_conversations_fts_update
+    AFTER UPDATE OF user_msg, agent_msg ON conversations BEGIN
+        UPDATE memory_fts
+        SET content = 'User: ' || NEW.user_msg || char(10) || 'Assistant: ' || NEW.agent_msg
+        WHERE rowid = NEW.id * 3;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_priorities_fts_insert
+    AFTER INSERT ON priorities BEGIN
+        INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+        VALUES (NEW.id * 3 + 1, 'Priority: ' || NEW.text,
+                NEW.session_id, 'priority_' || NEW.id, 'priority');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_priorities_fts_delete
+    AFTER DELETE ON priorities BEGIN
+        DELETE FROM memory_fts WHERE rowid = OLD.id * 3 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_priorities_fts_update
+    AFTER UPDATE OF text ON priorities BEGIN
+        UPDATE memory_fts SET content = 'Priority: ' || NEW.text WHERE rowid = NEW.id * 3 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_summaries_fts_insert
+    AFTER INSERT ON summaries BEGIN
+        INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+        VALUES (NEW.id * 3 + 2, 'Summary: ' || NEW.summary, NEW.session_id,
+                'summary_' || NEW.session_id || '_' || NEW.turn_count, 'summary');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_summaries_fts_delete
+    AFTER DELETE ON summaries BEGIN
+        DELETE FROM memory_fts WHERE rowid = OLD.id * 3 + 2;
+    END
+    """,
+)
+
+
+def _migrate_fts_index(conn: sqlite3.Connection) -> None:
+    # Keyword index over every remembered document. Text and doc_id mirror the
+    # ChromaDB documents so hybrid retrieval can fuse both result lists.
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS memory_fts USING fts5(
+            content,
+            session_id,
+            doc_id UNINDEXED,
+            kind   UNINDEXED
+        )
+    """)
+    # Not executescript(): it would COMMIT the migration transaction early
+    for trigger in _FTS_TRIGGERS:
+        conn.execute(trigger)
+    conn.execute("""
+        INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+        SELECT id * 3, 'User: ' || user_msg || char(10) || 'Assistant: ' || agent_msg,
+               session_id, 'conv_' || session_id || '_' || id, 'conversation'
+        FROM conversations
+    """)
+    conn.execute("""
+        INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+        SELECT id * 3 + 1, 'Priority: ' || text, session_id, 'priority_' || id, 'priority'
+        FROM priorities
+    """)
+    conn.execute("""
+        INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+        SELECT id * 3 + 2, 'Summary: ' || summary, session_id,
+               'summary_' || session_id || '_' || turn_count, 'summary'
+        FROM summaries
+    """)
+
+
+def _migrate_memory_version(conn: sqlite3.Connection) -> None:
+    # memory_version advances on any change to what the agent can remember
+    # (turns, priorities, summaries); cached answers are tied to a version.
+    conn.execute(
+        "ALTER TABLE session_counters ADD COLUMN memory_version INTEGER NOT NULL DEFAULT 0"
+    )
+    conn.execute("DROP TRIGGER IF EXISTS trg_conversations_count")
+    conn.execute("""
+        CREATE TRIGGER trg_conversations_count
+        AFTER INSERT ON conversations
+        BEGIN
+            INSERT INTO session_counters (session_id, turn_count, memory_version)
+            VALUES (COALESCE(NEW.session_id, 'default'), 1, 1)
+            ON CONFLICT(session_id) DO UPDATE
+            SET turn_count = turn_count + 1, memory_version = memory_version + 1;
+        END
+    """)
+    for table, events in (
+        ("conversations", ("DELETE",)),
+        ("priorities", ("INSERT", "UPDATE", "DELETE")),
+        ("summaries", ("INSERT", "DELETE")),
+    ):
+        for event in events:
+            row = "OLD" if event == "DELETE" else "NEW"
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO session_counters (session_id, memory_version)
+                    VALUES (COALESCE({row}.session_id, 'default'), 1)
+                    ON CONFLICT(session_id) DO UPDATE SET memory_version = memory_version + 1;
+                END
+            """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS response_cache (
+            session_id     TEXT    NOT NULL,
+            prompt_key     TEXT    NOT NULL,
+            memory_version INTEGER NOT NULL,
+            response       TEXT    NOT NULL,
+            created_at     REAL    NOT NULL,
+            last_used      REAL    NOT NULL,
+            PRIMARY KEY (session_id, prompt_key)
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache (last_used)"
+    )
+
+
+def _migrate_import_jobs(conn: sqlite3.Connection) -> None:
+    # Bulk NDJSON imports, processed in the background from a spooled file.
+    # byte_offset only advances in the transaction that writes the rows
+    # before it, so a re-claimed job resumes exactly where it stopped.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id  TEXT    NOT NULL,
+            path        TEXT    NOT NULL,
+            size        INTEGER NOT NULL,
+            byte_offset INTEGER NOT NULL DEFAULT 0,
+            lines       INTEGER NOT NULL DEFAULT 0,
+            turns       INTEGER NOT NULL DEFAULT 0,
+            priorities  INTEGER NOT NULL DEFAULT 0,
+            summaries   INTEGER NOT NULL DEFAULT 0,
+            skipped     INTEGER NOT NULL DEFAULT 0,
+            status      TEXT    NOT NULL DEFAULT 'pending',
+            attempts    INTEGER NOT NULL DEFAULT 0,
+            run_after   REAL    NOT NULL DEFAULT 0,
+            last_error  TEXT,
+            created_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs (status, run_after)"
+    )
+
+
+def _migrate_priorities_keyset_index(conn: sqlite3.Connection) -> None:
+    # Keyset pagination of /priorities walks (session_id, id)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_priorities_session_id ON priorities (session_id, id)"
+    )
+
+
+def _migrate_retention(conn: sqlite3.Connection) -> None:
+    # Archive summaries stand in for turns folded away by the retention job.
+    # They are retrieved like any memory but never used as the latest snapshot.
+    conn.execute("ALTER TABLE summaries ADD COLUMN kind TEXT NOT NULL DEFAULT 'snapshot'")
+    conn.execute("ALTER TABLE summaries ADD COLUMN last_turn_id INTEGER")
+    conn.execute("DROP TRIGGER IF EXISTS trg_summaries_fts_insert")
+    conn.execute("""
+        CREATE TRIGGER trg_summaries_fts_insert
+        AFTER INSERT ON summaries BEGIN
+            INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+            VALUES (NEW.id * 3 + 2, 'Summary: ' || NEW.summary, NEW.session_id,
+                    CASE NEW.kind
+                        WHEN 'archive' THEN 'archive_' || NEW.session_id || '_' || NEW.last_turn_id
+                        ELSE 'summary_' || NEW.session_id || '_' || NEW.turn_count
+                    END,
+                    'summary');
+        END
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conversations_archive (
+            id          INTEGER PRIMARY KEY,
+            user_msg    TEXT    NOT NULL,
+            agent_msg   TEXT    NOT NULL,
+            session_id  TEXT    NOT NULL,
+            created_at  DATETIME,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_conversations_archive_session "
+        "ON conversations_archive (session_id, id)"
+    )
+    # Per-session overrides of the RETENTION_* defaults; NULL/0 = no limit
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS retention_policies (
+            session_id TEXT PRIMARY KEY,
+            max_turns  INTEGER,
+            max_days   REAL,
+            mode       TEXT NOT NULL DEFAULT 'archive'
+        )
+    """)
+
+
+def _migrate_summary_levels(conn: sqlite3.Connection) -> None:
+    # Snapshots form a tree: level 0 is the rolling leaf, level n rolls up
+    # level n-1. Rollups share their newest child's turn_count, so the level
+    # goes into the doc id.
+    conn.execute("ALTER TABLE summaries ADD COLUMN level INTEGER NOT NULL DEFAULT 0")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_summaries_level ON summaries (session_id, kind, level, id)"
+    )
+    conn.execute("DROP TRIGGER IF EXISTS trg_summaries_fts_insert")
+    conn.execute("""
+        CREATE TRIGGER trg_summaries_fts_insert
+        AFTER INSERT ON summaries BEGIN
+            INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+            VALUES (NEW.id * 3 + 2, 'Summary: ' || NEW.summary, NEW.session_id,
+                    CASE
+                        WHEN NEW.kind = 'archive' THEN 'archive_' || NEW.session_id || '_' || NEW.last_turn_id
+                        WHEN NEW.level > 0 THEN 'summary_' || NEW.session_id || '_' || NEW.turn_count || '_L' || NEW.level
+                        ELSE 'summary_' || NEW.session_id || '_' || NEW.turn_count
+                    END,
+                    'summary');
+        END
+    """)
+
+
+def _migrate_priority_lifecycle(conn: sqlite3.Connection) -> None:
+    # status says why a priority stopped being active ('done' or 'dropped');
+    # active stays the flag everything filters on. Inactive priorities leave
+    # the FTS index so keyword retrieval only sees live goals.
+    conn.execute("ALTER TABLE priorities ADD COLUMN status TEXT NOT NULL DEFAULT 'active'")
+    conn.execute("ALTER TABLE priorities ADD COLUMN mentions INTEGER NOT NULL DEFAULT 1")
+    conn.execute("ALTER TABLE priorities ADD COLUMN updated_at DATETIME")
+    conn.execute("UPDATE priorities SET status = 'dropped' WHERE active = 0")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_priorities_active ON priorities (session_id, active, id)"
+    )
+    conn.execute("DROP TRIGGER IF EXISTS trg_priorities_fts_insert")
+    conn.execute("""
+        CREATE TRIGGER trg_priorities_fts_insert
+        AFTER INSERT ON priorities WHEN NEW.active = 1 BEGIN
+            INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+            VALUES (NEW.id * 3 + 1, 'Priority: ' || NEW.text,
+                    NEW.session_id, 'priority_' || NEW.id, 'priority');
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER trg_priorities_fts_deactivate
+        AFTER UPDATE OF active ON priorities WHEN OLD.active = 1 AND NEW.active = 0 BEGIN
+            DELETE FROM memory_fts WHERE rowid = NEW.id * 3 + 1;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER trg_priorities_fts_reactivate
+        AFTER UPDATE OF active ON priorities WHEN OLD.active = 0 AND NEW.active = 1 BEGIN
+            INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+            VALUES (NEW.id * 3 + 1, 'Priority: ' || NEW.text,
+                    NEW.session_id, 'priority_' || NEW.id, 'priority');
+        END
+    """)
+    conn.execute(
+        "DELETE FROM memory_fts WHERE rowid IN (SELECT id * 3 + 1 FROM priorities WHERE active = 0)"
+    )
+
+
+def _migrate_idempotency_keys(conn: sqlite3.Connection) -> None:
+    # A client-supplied Idempotency-Key is stored with the turn it produced,
+    # so a retried /chat replays that turn instead of running the agent again.
+    conn.execute("ALTER TABLE conversations ADD COLUMN idempotency_key TEXT")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_conversations_idempotency "
+        "ON conversations (session_id, idempotency_key) WHERE idempotency_key IS NOT NULL"
+    )
+
+
+def _migrate_embedding_cache_age(conn: sqlite3.Connection) -> None:
+    # Insert time for size-bounded eviction of the on-disk embedding cache;
+    # rows from before this version count as oldest.
+    conn.execute("ALTER TABLE embedding_cache ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_embedding_cache_created ON embedding_cache (created_at)"
+    )
+
+
+def _migrate_fts_session_filter(conn: sqlite3.Connection) -> None:
+    # A tokenized session_id only supports phrase matches, so session "a"
+    # also matched "a-2". Rebuild with session_id UNINDEXED and compare it
+    # with = in SQL. Dropping the table leaves the triggers that write to it.
+    conn.execute("DROP TABLE IF EXISTS memory_fts")
+    conn.execute("""
+        CREATE VIRTUAL TABLE memory_fts USING fts5(
+            content,
+            session_id UNINDEXED,
+            doc_id     UNINDEXED,
+            kind       UNINDEXED
+        )
+    """)
+    conn.execute("""
+        INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+        SELECT id * 3, 'User: ' || user_msg || char(10) || 'Assistant: ' || agent_msg,
+               session_id, 'conv_' || session_id || '_' || id, 'conversation'
+        FROM conversations
+    """)
+    conn.execute("""
+        INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+        SELECT id * 3 + 1, 'Priority: ' || text, session_id, 'priority_' || id, 'priority'
+        FROM priorities WHERE active = 1
+    """)
+    conn.execute("""
+        INSERT INTO memory_fts (rowid, content, session_id, doc_id, kind)
+        SELECT id * 3 + 2, 'Summary: ' || summary, session_id,
+               CASE
+                   WHEN kind = 'archive' THEN 'archive_' || session_id || '_' || last_turn_id
+                   WHEN level > 0 THEN 'summary_' || session_id || '_' || turn_count || '_L' || level
+                   ELSE 'summary_' || session_id || '_' || turn_count
+               END,
+               'summary'
+        FROM summaries
+    """)
+
+
+MIGRATIONS = [
+    _migrate_base_tables,
+    _migrate_indexes_and_turn_counter,
+    _migrate_summary_jobs,
+    _migrate_embedding_queue,
+    _migrate_embedding_cache,
+    _migrate_fts_index,
+    _migrate_memory_version,
+    _migrate_import_jobs,
+    _migrate_priorities_keyset_index,
+    _migrate_retention,
+    _migrate_summary_levels,
+    _migrate_priority_lifecycle,
+    _migrate_idempotency_keys,
+    _migrate_fts_session_filter,
+    _migrate_embedding_cache_age,
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db() -> None:
+    """Create the schema, or upgrade an existing file to the latest version."""
+    conn = get_connection()
+    version = get_schema_version(conn)
+    for target, migrate in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            if get_schema_version(conn) >= target:
+                conn.rollback()
+                continue
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
             conn.commit()
-        except sqlite3.OperationalError:
-            pass  # Column already exists
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def get_setting(key: str, default: str = "") -> str:
@@ -86,39 +694,579 @@ def save_priority(text: str, session_id: str = "default") -> int:
         return cursor.lastrowid
 
 
+_PRIORITY_COLUMNS = "id, text, created_at, active, status, mentions, updated_at"
+
+
 def get_all_priorities(session_id: str = "default") -> List[Dict]:
     with get_connection() as conn:
         rows = conn.execute(
-            "SELECT id, text, created_at, active FROM priorities WHERE session_id = ? ORDER BY created_at DESC",
+            f"SELECT {_PRIORITY_COLUMNS} FROM priorities WHERE session_id = ? ORDER BY created_at DESC",
             (session_id,),
         ).fetchall()
     return [dict(r) for r in rows]
 
 
+def get_priority(priority_id: int, session_id: str = "default") -> Optional[Dict]:
+    with get_connection() as conn:
+        row = conn.execute(
+            f"SELECT {_PRIORITY_COLUMNS} FROM priorities WHERE id = ? AND session_id = ?",
+            (priority_id, session_id),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def find_active_priority(session_id: str, text: str) -> Optional[Dict]:
+    """An active priority with the same text, ignoring case and outer whitespace."""
+    with get_connection() as conn:
+        row = conn.execute(
+            f"SELECT {_PRIORITY_COLUMNS} FROM priorities "
+            "WHERE session_id = ? AND active = 1 AND lower(trim(text)) = lower(trim(?)) LIMIT 1",
+            (session_id, text),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+# ── Paginated listings ────────────────────────────────────────────
+#
+# Keyset pagination on id: pages run newest first and `before` is the
+# smallest id already seen, so each page is an index range scan no matter
+# how deep the caller has paged. since is inclusive, until exclusive.
+
+def _sqlite_timestamp(value: datetime) -> str:
+    """Format like CURRENT_TIMESTAMP (UTC, space-separated) so text comparison works."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _listing_filters(
+    session_id: str, since: Optional[datetime], until: Optional[datetime],
+    active: Optional[bool] = None,
+) -> Tuple[str, List[Any]]:
+    clauses, params = ["session_id = ?"], [session_id]
+    if since is not None:
+        clauses.append("created_at >= ?")
+        params.append(_sqlite_timestamp(since))
+    if until is not None:
+        clauses.append("created_at < ?")
+        params.append(_sqlite_timestamp(until))
+    if active is not None:
+        clauses.append("active = ?")
+        params.append(1 if active else 0)
+    return " AND ".join(clauses), params
+
+
+def _page(sql: str, params: List[Any], before: Optional[int], limit: int) -> Tuple[List[Dict], Optional[int]]:
+    if before is not None:
+        sql += " AND id < ?"
+        params = params + [before]
+    with get_connection() as conn:
+        rows = conn.execute(sql + " ORDER BY id DESC LIMIT ?", (*params, limit + 1)).fetchall()
+    page = [dict(r) for r in rows[:limit]]
+    return page, (page[-1]["id"] if len(rows) > limit else None)
+
+
+def get_history_page(
+    session_id: str = "default", limit: int = 10, before: Optional[int] = None,
+    since: Optional[datetime] = None, until: Optional[datetime] = None,
+) -> Tuple[List[Dict], Optional[int]]:
+    """Up to `limit` turns older than `before`, oldest first, and the next cursor (or None)."""
+    where, params = _listing_filters(session_id, since, until)
+    page, cursor = _page(
+        f"SELECT id, user_msg, agent_msg, created_at FROM conversations WHERE {where}",
+        params, before, limit,
+    )
+    return page[::-1], cursor
+
+
+def get_priorities_page(
+    session_id: str = "default", limit: int = 100, before: Optional[int] = None,
+    since: Optional[datetime] = None, until: Optional[datetime] = None,
+    active: Optional[bool] = None,
+) -> Tuple[List[Dict], Optional[int]]:
+    """Up to `limit` priorities older than `before`, newest first, and the next cursor (or None)."""
+    where, params = _listing_filters(session_id, since, until, active)
+    return _page(
+        f"SELECT {_PRIORITY_COLUMNS} FROM priorities WHERE {where}",
+        params, before, limit,
+    )
+
+
+def iter_history(
+    session_id: str = "default", after: Optional[int] = None,
+    since: Optional[datetime] = None, until: Optional[datetime] = None,
+) -> Iterator[Dict]:
+    """Every matching turn, oldest first, streamed from one cursor."""
+    where, params = _listing_filters(session_id, since, until)
+    if after is not None:
+        where += " AND id > ?"
+        params.append(after)
+    return iter_rows(
+        f"SELECT id, user_msg, agent_msg, created_at FROM conversations WHERE {where} ORDER BY id",
+        tuple(params),
+    )
+
+
+def iter_priorities(
+    session_id: str = "default", after: Optional[int] = None,
+    since: Optional[datetime] = None, until: Optional[datetime] = None,
+    active: Optional[bool] = None,
+) -> Iterator[Dict]:
+    """Every matching priority, oldest first, streamed from one cursor."""
+    where, params = _listing_filters(session_id, since, until, active)
+    if after is not None:
+        where += " AND id > ?"
+        params.append(after)
+    return iter_rows(
+        f"SELECT {_PRIORITY_COLUMNS} FROM priorities WHERE {where} ORDER BY id",
+        tuple(params),
+    )
+
+
 # ── Summary helpers ───────────────────────────────────────────────
 
-def save_summary(session_id: str, summary: str, turn_count: int) -> None:
+def save_summary(session_id: str, summary: str, turn_count: int, level: int = 0) -> None:
     with get_connection() as conn:
         conn.execute(
-            "INSERT INTO summaries (session_id, summary, turn_count) VALUES (?, ?, ?)",
-            (session_id, summary, turn_count),
+            "INSERT INTO summaries (session_id, summary, turn_count, level) VALUES (?, ?, ?, ?)",
+            (session_id, summary, turn_count, level),
         )
         conn.commit()
 
 
-def get_latest_summary(session_id: str = "default") -> Optional[str]:
+def has_summary(session_id: str, turn_count: int) -> bool:
     with get_connection() as conn:
         row = conn.execute(
-            "SELECT summary FROM summaries WHERE session_id = ? ORDER BY id DESC LIMIT 1",
-            (session_id,),
+            "SELECT 1 FROM summaries WHERE session_id = ? AND turn_count = ? "
+            "AND kind = 'snapshot' AND level = 0 LIMIT 1",
+            (session_id, turn_count),
         ).fetchone()
+    return row is not None
+
+
+def get_latest_summary(session_id: str = "default") -> Optional[str]:
+    """Text of the newest leaf snapshot."""
+    row = get_last_summary(session_id, 0)
     return row["summary"] if row else None
 
 
+def get_last_summary(session_id: str, level: int) -> Optional[Dict]:
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT id, summary, turn_count, level FROM summaries "
+            "WHERE session_id = ? AND kind = 'snapshot' AND level = ? ORDER BY id DESC LIMIT 1",
+            (session_id, level),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def get_summaries_since(session_id: str, level: int, after_id: int) -> List[Dict]:
+    """Snapshots at `level` written after summary `after_id`, oldest first."""
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT id, summary, turn_count, level FROM summaries "
+            "WHERE session_id = ? AND kind = 'snapshot' AND level = ? AND id > ? ORDER BY id",
+            (session_id, level, after_id),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_summary_digest(session_id: str = "default") -> List[Dict]:
+    """Newest snapshot at each level, highest level first."""
+    with get_connection() as conn:
+        rows = conn.execute(
+            """SELECT level, summary, turn_count FROM summaries
+               WHERE id IN (SELECT MAX(id) FROM summaries
+                            WHERE session_id = ? AND kind = 'snapshot' GROUP BY level)
+               ORDER BY level DESC""",
+            (session_id,),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
 def get_turn_count(session_id: str = "default") -> int:
+    """Turns saved for this session since it was last cleared (O(1) counter lookup)."""
     with get_connection() as conn:
         row = conn.execute(
-            "SELECT COUNT(*) as cnt FROM conversations WHERE session_id = ?",
+            "SELECT turn_count FROM session_counters WHERE session_id = ?",
             (session_id,),
         ).fetchone()
-    return row["cnt"]
+    return row["turn_count"] if row else 0
+
+
+def get_memory_version(session_id: str = "default") -> int:
+    """Counter that advances whenever this session's memory changes."""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT memory_version FROM session_counters WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+    return row["memory_version"] if row else 0
+
+
+# ── Export pages ──────────────────────────────────────────────────
+#
+# Keyset pages (id > after_id) so a full-session export never holds more
+# than one page in memory and never re-scans skipped rows.
+
+_EXPORT_QUERIES = {
+    "turn": "SELECT id, user_msg, agent_msg, created_at FROM conversations "
+            "WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+    "priority": "SELECT id, text, active, status, created_at FROM priorities "
+                "WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+    "summary": "SELECT id, summary, turn_count, kind, level, last_turn_id, created_at FROM summaries "
+               "WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+    "archived_turn": "SELECT id, user_msg, agent_msg, created_at, archived_at FROM conversations_archive "
+                     "WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+}
+
+
+def get_export_page(kind: str, session_id: str, after_id: int, limit: int) -> List[Dict]:
+    """Next `limit` rows of one record kind (a key of _EXPORT_QUERIES), by id."""
+    with get_connection() as conn:
+        rows = conn.execute(_EXPORT_QUERIES[kind], (session_id, after_id, limit)).fetchall()
+    return [dict(r) for r in rows]
+
+
+# ── Response cache ────────────────────────────────────────────────
+
+def get_cached_response(
+    session_id: str, prompt_key: str, memory_version: int, max_age: float, now: float,
+) -> Optional[str]:
+    """Cached answer for this prompt if memory is unchanged and it is fresh."""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT response FROM response_cache "
+            "WHERE session_id = ? AND prompt_key = ? AND memory_version = ? AND created_at >= ?",
+            (session_id, prompt_key, memory_version, now - max_age),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE response_cache SET last_used = ? WHERE session_id = ? AND prompt_key = ?",
+            (now, session_id, prompt_key),
+        )
+        conn.commit()
+    return row["response"]
+
+
+def put_cached_response(
+    session_id: str, prompt_key: str, memory_version: int, response: str,
+    now: float, max_entries: int,
+) -> None:
+    """Store an answer, evicting least-recently-used entries beyond max_entries."""
+    with get_connection() as conn:
+        conn.execute(
+            """INSERT INTO response_cache
+                   (session_id, prompt_key, memory_version, response, created_at, last_used)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(session_id, prompt_key) DO UPDATE SET
+                   memory_version = excluded.memory_version, response = excluded.response,
+                   created_at = excluded.created_at, last_used = excluded.last_used""",
+            (session_id, prompt_key, memory_version, response, now, now),
+        )
+        conn.execute(
+            """DELETE FROM response_cache WHERE rowid IN (
+                   SELECT rowid FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+               )""",
+            (max_entries,),
+        )
+        conn.commit()
+
+
+# ── Keyword search (FTS5) ─────────────────────────────────────────
+
+_FTS_STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from has have how i in is it its me my of on "
+    "or so that the this to was what when where which who why will with you your".split()
+)
+
+
+def _fts_query(text: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 query matching any term."""
+    terms = [t for t in re.findall(r"\w+", text.lower()) if t not in _FTS_STOPWORDS]
+    if not terms:
+        return None
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+def keyword_search(query: str, limit: int = 5, session_id: str = "default") -> List[Dict]:
+    """BM25-ranked matches from the FTS5 index, best first."""
+    match = _fts_query(query)
+    if match is None:
+        return []
+    with metrics.span("db.keyword_search"), get_connection() as conn:
+        rows = conn.execute(
+            "SELECT doc_id, kind, content, bm25(memory_fts) AS score FROM memory_fts "
+            "WHERE memory_fts MATCH ? AND session_id = ? ORDER BY score LIMIT ?",
+            (match, session_id, limit),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+# ── Summary job queue ─────────────────────────────────────────────
+
+def enqueue_summary_job(session_id: str, turn_count: int) -> bool:
+    """Queue a summarisation job; False if one already exists for this turn."""
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO summary_jobs (session_id, turn_count) VALUES (?, ?)",
+            (session_id, turn_count),
+        )
+        conn.commit()
+    return cursor.rowcount == 1
+
+
+def claim_summary_job(now: float, lease_seconds: float, max_attempts: int) -> Optional[Dict]:
+    """Atomically take the oldest runnable job.
+
+    Pending jobs become runnable once run_after passes; running jobs whose
+    lease expired (worker crashed) are picked up again, unless they have
+    used up max_attempts, in which case they are marked failed.
+    """
+    with get_connection() as conn:
+        conn.execute(
+            """UPDATE summary_jobs
+               SET status = 'failed', last_error = COALESCE(last_error, 'lease expired')
+               WHERE status IN ('pending', 'running') AND run_after <= ? AND attempts >= ?""",
+            (now, max_attempts),
+        )
+        row = conn.execute(
+            """UPDATE summary_jobs
+               SET status = 'running', attempts = attempts + 1, run_after = ?
+               WHERE id = (
+                   SELECT id FROM summary_jobs
+                   WHERE status IN ('pending', 'running') AND run_after <= ? AND attempts < ?
+                   ORDER BY run_after LIMIT 1
+               )
+               RETURNING id, session_id, turn_count, attempts""",
+            (now + lease_seconds, now, max_attempts),
+        ).fetchone()
+        conn.commit()
+    return dict(row) if row else None
+
+
+def complete_summary_job(job_id: int) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            "UPDATE summary_jobs SET status = 'done', last_error = NULL WHERE id = ?",
+            (job_id,),
+        )
+        conn.commit()
+
+
+def fail_summary_job(job_id: int, error: str, retry_at: Optional[float]) -> None:
+    """Schedule a retry at `retry_at`, or mark the job failed when None."""
+    with get_connection() as conn:
+        if retry_at is None:
+            conn.execute(
+                "UPDATE summary_jobs SET status = 'failed', last_error = ? WHERE id = ?",
+                (error, job_id),
+            )
+        else:
+            conn.execute(
+                "UPDATE summary_jobs SET status = 'pending', last_error = ?, run_after = ? WHERE id = ?",
+                (error, retry_at, job_id),
+            )
+        conn.commit()
+
+
+# ── Embedding queue ───────────────────────────────────────────────
+#
+# These take the caller's connection so the enqueue commits atomically
+# with the row being embedded.
+
+def enqueue_embedding(
+    conn: sqlite3.Connection, doc_id: str, document: str, metadata: Dict,
+) -> None:
+    conn.execute(
+        """INSERT OR REPLACE INTO embedding_queue (doc_id, session_id, document, metadata)
+           VALUES (?, ?, ?, ?)""",
+        (doc_id, metadata.get("session_id", "default"), document, json.dumps(metadata)),
+    )
+
+
+def enqueue_embeddings(conn: sqlite3.Connection, items: List[Tuple[str, str, Dict]]) -> None:
+    """Batch form of enqueue_embedding() for (doc_id, document, metadata) tuples."""
+    conn.executemany(
+        """INSERT OR REPLACE INTO embedding_queue (doc_id, session_id, document, metadata)
+           VALUES (?, ?, ?, ?)""",
+        [(doc_id, meta.get("session_id", "default"), doc, json.dumps(meta)) for doc_id, doc, meta in items],
+    )
+
+
+def get_embedding_batch(limit: int, session_id: Optional[str] = None) -> List[Dict]:
+    """Oldest queued embeddings, optionally for one session only."""
+    with get_connection() as conn:
+        if session_id is None:
+            rows = conn.execute(
+                "SELECT id, doc_id, document, metadata FROM embedding_queue ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT id, doc_id, document, metadata FROM embedding_queue "
+                "WHERE session_id = ? ORDER BY id LIMIT ?",
+                (session_id, limit),
+            ).fetchall()
+    return [{**dict(r), "metadata": json.loads(r["metadata"])} for r in rows]
+
+
+def delete_embedding_batch(ids: List[int]) -> None:
+    with get_connection() as conn:
+        conn.executemany("DELETE FROM embedding_queue WHERE id = ?", [(i,) for i in ids])
+        conn.commit()
+
+
+def has_pending_embeddings(session_id: str) -> bool:
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT 1 FROM embedding_queue WHERE session_id = ? LIMIT 1", (session_id,),
+        ).fetchone()
+    return row is not None
+
+
+# ── Import jobs ───────────────────────────────────────────────────
+
+def create_import_job(session_id: str, path: str, size: int) -> Dict:
+    with get_connection() as conn:
+        row = conn.execute(
+            "INSERT INTO import_jobs (session_id, path, size) VALUES (?, ?, ?) RETURNING *",
+            (session_id, path, size),
+        ).fetchone()
+        conn.commit()
+    return dict(row)
+
+
+def get_import_job(job_id: int) -> Optional[Dict]:
+    with get_connection() as conn:
+        row = conn.execute("SELECT * FROM import_jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def claim_import_job(now: float, lease_seconds: float) -> Optional[Dict]:
+    """Atomically take the oldest runnable import; same lease rules as summary jobs."""
+    with get_connection() as conn:
+        row = conn.execute(
+            """UPDATE import_jobs
+               SET status = 'running', attempts = attempts + 1, run_after = ?
+               WHERE id = (
+                   SELECT id FROM import_jobs
+                   WHERE status IN ('pending', 'running') AND run_after <= ?
+                   ORDER BY run_after LIMIT 1
+               )
+               RETURNING *""",
+            (now + lease_seconds, now),
+        ).fetchone()
+        conn.commit()
+    return dict(row) if row else None
+
+
+def record_import_progress(conn: sqlite3.Connection, job: Dict, lease_until: float) -> None:
+    """Persist a job's counters and offset; commits with the caller's batch."""
+    conn.execute(
+        """UPDATE import_jobs
+           SET byte_offset = ?, lines = ?, turns = ?, priorities = ?, summaries = ?,
+               skipped = ?, last_error = ?, run_after = ?
+           WHERE id = ?""",
+        (job["byte_offset"], job["lines"], job["turns"], job["priorities"], job["summaries"],
+         job["skipped"], job["last_error"], lease_until, job["id"]),
+    )
+
+
+def complete_import_job(job_id: int) -> None:
+    with get_connection() as conn:
+        conn.execute("UPDATE import_jobs SET status = 'done' WHERE id = ?", (job_id,))
+        conn.commit()
+
+
+def fail_import_job(job_id: int, error: str, retry_at: Optional[float]) -> None:
+    """Schedule a retry at `retry_at` (from the saved offset), or mark failed when None."""
+    with get_connection() as conn:
+        if retry_at is None:
+            conn.execute(
+                "UPDATE import_jobs SET status = 'failed', last_error = ? WHERE id = ?",
+                (error, job_id),
+            )
+        else:
+            conn.execute(
+                "UPDATE import_jobs SET status = 'pending', last_error = ?, run_after = ? WHERE id = ?",
+                (error, retry_at, job_id),
+            )
+        conn.commit()
+
+
+# ── Retention ─────────────────────────────────────────────────────
+
+def get_retention_policy(session_id: str) -> Optional[Dict]:
+    """This session's override row, or None to use the RETENTION_* defaults."""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT max_turns, max_days, mode FROM retention_policies WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def set_retention_policy(
+    session_id: str, max_turns: Optional[int], max_days: Optional[float], mode: str,
+) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            """INSERT INTO retention_policies (session_id, max_turns, max_days, mode)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(session_id) DO UPDATE SET
+                   max_turns = excluded.max_turns, max_days = excluded.max_days, mode = excluded.mode""",
+            (session_id, max_turns, max_days, mode),
+        )
+        conn.commit()
+
+
+def get_session_ids() -> List[str]:
+    with get_connection() as conn:
+        rows = conn.execute("SELECT session_id FROM session_counters ORDER BY session_id").fetchall()
+    return [r["session_id"] for r in rows]
+
+
+def get_expired_turns(
+    session_id: str, max_turns: Optional[int], max_days: Optional[float], limit: int,
+) -> List[Dict]:
+    """Oldest turns outside the newest `max_turns` or older than `max_days` days."""
+    clauses, params = [], [session_id]
+    if max_turns:
+        clauses.append(
+            "id <= (SELECT id FROM conversations WHERE session_id = ? "
+            "ORDER BY id DESC LIMIT 1 OFFSET ?)"
+        )
+        params += [session_id, max_turns]
+    if max_days:
+        clauses.append("created_at < datetime('now', ?)")
+        params.append(f"-{max_days} days")
+    if not clauses:
+        return []
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"SELECT id, user_msg, agent_msg, created_at FROM conversations "
+            f"WHERE session_id = ? AND ({' OR '.join(clauses)}) ORDER BY id LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def free_page_ratio() -> float:
+    """Fraction of the database file that is free pages (what VACUUM would reclaim)."""
+    with get_connection() as conn:
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return free / pages if pages else 0.0
+
+
+def compact_database(vacuum: bool) -> None:
+    """Merge FTS segments, refresh planner stats and optionally VACUUM."""
+    conn = get_connection()
+    conn.execute("INSERT INTO memory_fts (memory_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.execute("PRAGMA optimize")
+    if vacuum:
+        conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
@@ -0,0 +1,137 @@
+"""
+Content-addressed embedding cache shared by search, ingest and reindex.
+
+Vectors are keyed by sha256(model id + text). Lookups go through an
+in-process LRU first, then the embedding_cache table in SQLite; only the
+remaining misses reach the embedding model, in one batch. Callers pass
+the resulting vectors to ChromaDB directly, so Chroma never re-embeds.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Sequence
+
+import metrics
+from database import get_connection
+
+EMBEDDING_MODEL_ID = "all-MiniLM-L6-v2"  # ChromaDB's default embedding function
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+# Rows kept in the on-disk tier; the oldest are evicted by prune_disk_cache()
+EMBED_DISK_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_DISK_CACHE_MAX_ENTRIES", "100000"))
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+_lru: "OrderedDict[str, List[float]]" = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def _get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+                _embedder = DefaultEmbeddingFunction()
+    return _embedder
+
+
+def _key(text: str) -> str:
+    return hashlib.sha256(f"{EMBEDDING_MODEL_ID}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _lru_get(key: str):
+    with _lru_lock:
+        vector = _lru.get(key)
+        if vector is not None:
+            _lru.move_to_end(key)
+        return vector
+
+
+def _lru_put(key: str, vector: List[float]) -> None:
+    with _lru_lock:
+        _lru[key] = vector
+        _lru.move_to_end(key)
+        while len(_lru) > EMBED_CACHE_SIZE:
+            _lru.popitem(last=False)
+
+
+def _count(stat: str, n: int) -> None:
+    if n:
+        metrics.incr(f"embedding_cache.{stat}", n)
+
+
+def _disk_get(keys: List[str]) -> Dict[str, List[float]]:
+    found: Dict[str, List[float]] = {}
+    with get_connection() as conn:
+        for i in range(0, len(keys), 500):  # stay under SQLite's bound-parameter limit
+            chunk = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, vector FROM embedding_cache WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for row in rows:
+                found[row["key"]] = array("f", row["vector"]).tolist()
+    return found
+
+
+def embed(texts: Sequence[str]) -> List[List[float]]:
+    """Return one embedding per text, computing only uncached ones."""
+    keys = [_key(t) for t in texts]
+    out: List = [_lru_get(k) for k in keys]
+    _count("memory_hits", sum(v is not None for v in out))
+
+    missing = list({k for k, v in zip(keys, out) if v is None})
+    if missing:
+        found = _disk_get(missing)
+        for k, v in found.items():
+            _lru_put(k, v)
+        _count("disk_hits", sum(1 for k, v in zip(keys, out) if v is None and k in found))
+
+        # Deduplicate so repeated texts in one batch embed once
+        todo = {k: t for k, t, v in zip(keys, texts, out) if v is None and k not in found}
+        if todo:
+            with metrics.span("embedding.compute"):
+                vectors = _get_embedder()(list(todo.values()))
+            computed = {k: [float(x) for x in v] for k, v in zip(todo, vectors)}
+            with get_connection() as conn:
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO embedding_cache (key, vector, created_at) VALUES (?, ?, ?)",
+                    [(k, array("f", v).tobytes(), now) for k, v in computed.items()],
+                )
+                conn.commit()
+            for k, v in computed.items():
+                _lru_put(k, v)
+            found.update(computed)
+        _count("misses", sum(1 for k, v in zip(keys, out) if v is None and k in todo))
+
+        out = [v if v is not None else found[k] for k, v in zip(keys, out)]
+    return out
+
+
+def prune_disk_cache(max_entries: int = EMBED_DISK_CACHE_MAX_ENTRIES) -> int:
+    """Evict the oldest on-disk vectors beyond max_entries; returns how many.
+
+    Deleted turns and priorities leave their vectors behind, so without this
+    the table only grows. An evicted vector still in use is just recomputed.
+    """
+    with get_connection() as conn:
+        deleted = conn.execute(
+            "DELETE FROM embedding_cache WHERE key IN ("
+            "SELECT key FROM embedding_cache ORDER BY created_at "
+            "LIMIT MAX((SELECT COUNT(*) FROM embedding_cache) - ?, 0))",
+            (max_entries,),
+        ).rowcount
+        conn.commit()
+    metrics.incr("embedding_cache.evicted", deleted)
+    return deleted
+
+
+def warm_up() -> None:
+    """Load the embedding model (first call initialises its runtime)."""
+    _get_embedder()(["warm-up"])
@@ -0,0 +1,200 @@
+"""
+Stand-in chat model for load tests: speaks the ReAct format and native tool
+calls, never calls Groq.
+
+Selected with MODEL_NAME=fake. Each call waits FAKE_LLM_LATENCY_MS before
+the first token, then emits FAKE_LLM_REPLY_TOKENS tokens at
+FAKE_LLM_TOKENS_PER_SEC. A question that mentions priorities first gets a
+get_priorities action (a ReAct "Action:" or, once tools are bound with
+bind_tools(), a structured tool call), so load tests exercise the tool
+round trip too. FAKE_LLM_MALFORMED_RATE makes that share of ReAct replies
+unparseable, to price the retry a text protocol pays for them.
+Direct-route prompts (ending in "Reply:") get the answer as plain text;
+other prompts without the ReAct scaffold (the summariser) get a short
+bullet list.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_TOKENS_PER_SEC = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "150"))  # 0 = no per-token delay
+FAKE_LLM_REPLY_TOKENS = int(os.getenv("FAKE_LLM_REPLY_TOKENS", "60"))
+FAKE_LLM_MALFORMED_RATE = float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0"))
+
+_FILLER = (
+    "That sounds like a solid step forward. What feels most at risk this week, "
+    "and is there one thing you could finish today to take pressure off the rest? "
+).split()
+
+
+def _text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return _text(messages[-1]) if messages else ""
+
+
+def _full_prompt(messages: List[BaseMessage], tools: Optional[Sequence[Dict]]) -> str:
+    """Everything the provider would bill as input: messages plus tool schemas."""
+    parts = [_text(m) for m in messages]
+    parts += [json.dumps(m.tool_calls) for m in messages if isinstance(m, AIMessage) and m.tool_calls]
+    if tools:
+        parts.append(json.dumps(list(tools)))
+    return "\n".join(parts)
+
+
+class FakeReActChatModel(BaseChatModel):
+    """Scripted ReAct or tool-call replies with configurable latency and token rate."""
+
+    latency: float = FAKE_LLM_LATENCY_MS / 1000
+    tokens_per_sec: float = FAKE_LLM_TOKENS_PER_SEC
+    reply_tokens: int = FAKE_LLM_REPLY_TOKENS
+    malformed_rate: float = FAKE_LLM_MALFORMED_RATE
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-react"
+
+    def _answer(self) -> str:
+        return " ".join(_FILLER[i % len(_FILLER)] for i in range(self.reply_tokens))
+
+    def _reply(self, prompt: str) -> str:
+        if prompt.rstrip().endswith("Reply:"):
+            return self._answer()  # agent's direct route: plain text, no ReAct
+        if "Final Answer:" not in prompt:
+            return "- Finish the work already in flight\n- Keep an eye on recurring blockers"
+        question, _, scratchpad = prompt.rpartition("Question:")[2].partition("\n")
+        question = question.strip()
+        if self.malformed_rate and random.random() < self.malformed_rate:
+            return "I think I should look at what the user saved before answering."
+        if "Observation:" not in scratchpad and "priorit" in question.lower():
+            return (
+                "Thought: I should check what the user has saved before answering.\n"
+                "Action: get_priorities\n"
+                f"Action Input: {question}"
+            )
+        return "Thought: I now have enough information to respond.\nFinal Answer: " + self._answer()
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _tool_reply(self, messages: List[BaseMessage], tools: Sequence[Dict]) -> Tuple[str, List[Dict]]:
+        """(answer text, tool calls) for a structured tool-calling turn."""
+        question = next((_text(m) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        names = {t["function"]["name"] for t in tools}
+        answered = any(isinstance(m, ToolMessage) for m in messages)
+        if not answered and "priorit" in question.lower() and "get_priorities" in names:
+            call = {"name": "get_priorities", "args": {"query": question}, "id": f"call_{uuid.uuid4().hex[:12]}"}
+            return "", [call]
+        return self._answer(), []
+
+    def _turn(self, messages: List[BaseMessage], tools: Optional[Sequence[Dict]]) -> Tuple[str, str, List[Dict]]:
+        """(billed prompt, reply text, tool calls) for one call."""
+        if tools:
+            text, calls = self._tool_reply(messages, tools)
+            return _full_prompt(messages, tools), text, calls
+        prompt = _prompt_text(messages)
+        return prompt, self._reply(prompt), []
+
+    def _tokens(self, text: str) -> List[str]:
+        words = text.split(" ")
+        return [w + " " for w in words[:-1]] + words[-1:]
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    def _usage(self, prompt: str, text: str, calls: Sequence[Dict] = ()) -> dict:
+        input_tokens = len(prompt) // 4
+        output_tokens = len(self._tokens(text)) if text else 0
+        output_tokens += sum(len(json.dumps(c["args"])) // 4 + 5 for c in calls)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+
+    def _message(self, prompt: str, text: str, calls: List[Dict]) -> AIMessage:
+        return AIMessage(content=text, tool_calls=calls, usage_metadata=self._usage(prompt, text, calls))
+
+    def _chunks(self, prompt: str, text: str, calls: List[Dict]) -> Iterator[ChatGenerationChunk]:
+        usage = self._usage(prompt, text, calls)
+        if calls:
+            # One chunk carrying every call, as providers do for short arguments
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=text,
+                tool_call_chunks=[
+                    {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                    for i, c in enumerate(calls)
+                ],
+                usage_metadata=usage,
+            ))
+            return
+        tokens = self._tokens(text)
+        for i, token in enumerate(tokens):
+            # Usage rides on the last chunk, as with the real streaming APIs
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=token, usage_metadata=usage if i == len(tokens) - 1 else None,
+            ))
+
+    def _delay(self, text: str) -> float:
+        return self.latency + self._token_delay() * len(self._tokens(text))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt, text, calls = self._turn(messages, kwargs.get("tools"))
+        time.sleep(self._delay(text))
+        return ChatResult(generations=[ChatGeneration(message=self._message(prompt, text, calls))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt, text, calls = self._turn(messages, kwargs.get("tools"))
+        await asyncio.sleep(self._delay(text))
+        return ChatResult(generations=[ChatGeneration(message=self._message(prompt, text, calls))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for chunk in self._chunks(*self._turn(messages, kwargs.get("tools"))):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            time.sleep(self._token_delay())
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(*self._turn(messages, kwargs.get("tools"))):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(self._token_delay())
@@ -1,19 +1,44 @@
+import asyncio
+import json
 import os
 from contextlib import asynccontextmanager
-from typing import List
+from datetime import datetime
+from typing import Dict, Iterator, List, Literal, Optional
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI, HTTPException, Depends, Header
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
-from database import init_db, get_all_priorities
-from agent import run_agent
-from memory import get_history, clear_memory
+import bulk
+import metrics
+import retention
+from database import (
+    init_db, close_connections, get_import_job, set_retention_policy,
+    get_history_page, get_priorities_page, iter_history, iter_priorities,
+)
+from agent import IdempotencyKeyReused, arun_agent, astream_agent, warm_up
+from router import ROUTES
+from memory import (
+    clear_memory, reindex, run_chroma, set_priority_status,
+    start_summary_worker, stop_summary_worker,
+    start_embedding_flusher, stop_embedding_flusher,
+)
 
 API_KEY = os.getenv("API_KEY")
 
+# In-flight /chat calls per worker; callers beyond that wait for a slot
+# for up to CHAT_QUEUE_TIMEOUT seconds before getting a 503.
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "256"))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "30"))
+
+# Adds Server-Timing (per-stage ms) and X-LLM-* headers to /chat responses
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "false").lower() in ("1", "true", "yes")
+
+WARM_UP_RETRY_MAX = 60.0  # seconds between warm-up attempts, at most
+
 
 def verify_api_key(x_api_key: str | None = Header(default=None)) -> None:
     if API_KEY and x_api_key != API_KEY:
@@ -23,7 +48,41 @@ def verify_api_key(x_api_key: str | None = Header(default=None)) -> None:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    app.state.chat_slots = asyncio.Semaphore(MAX_CONCURRENT_CHATS)
+    start_embedding_flusher()
+    start_summary_worker()
+    bulk.start_import_worker()  # resumes imports interrupted by a restart
+    retention.start_retention_worker()
+    # Heavy imports and the embedding model load in the background so the
+    # port opens straight away; /ready reports when that has finished.
+    app.state.ready = False
+    app.state.warm_up_error = None
+    app.state.warm_up = asyncio.create_task(_warm_up(app))
     yield
+    app.state.warm_up.cancel()
+    retention.stop_retention_worker()
+    bulk.stop_import_worker()
+    stop_summary_worker()
+    stop_embedding_flusher()
+    close_connections()
+
+
+async def _warm_up(app: FastAPI) -> None:
+    # Retried with backoff until it succeeds; /ready stays 503 meanwhile
+    # and reports the last error.
+    delay = 1.0
+    while True:
+        try:
+            await asyncio.to_thread(warm_up)
+        except Exception as e:
+            metrics.incr("warm_up.failures")
+            app.state.warm_up_error = str(e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARM_UP_RETRY_MAX)
+            continue
+        app.state.warm_up_error = None
+        app.state.ready = True
+        return
 
 
 app = FastAPI(
@@ -43,36 +102,181 @@ class ChatResponse(BaseModel):
 
 
 class HistoryItem(BaseModel):
+    id: int
     user_msg: str
     agent_msg: str
     created_at: str
 
 
+class PriorityUpdate(BaseModel):
+    status: Literal["active", "done", "dropped"]
+
+
+class RetentionPolicy(BaseModel):
+    max_turns: Optional[int] = Field(None, ge=1)
+    max_days: Optional[float] = Field(None, gt=0)
+    mode: Literal["archive", "delete"] = "archive"
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        error = getattr(request.app.state, "warm_up_error", None)
+        raise HTTPException(status_code=503, detail=f"Warm-up failed, retrying: {error}" if error else "Warming up")
+    return {"status": "ready"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Latency histograms, LLM call/token counts and counters, Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _agent_error(e: Exception) -> HTTPException:
+    error_msg = str(e).lower()
+    if "authentication" in error_msg or "api key" in error_msg:
+        return HTTPException(status_code=502, detail="Invalid Groq API key.")
+    if "connection" in error_msg:
+        return HTTPException(status_code=503, detail="Could not reach Groq API.")
+    return HTTPException(status_code=502, detail=str(e))
+
+
+def _chat_route(timings: dict) -> str:
+    """How the reply was produced: an agent route, or no agent run at all."""
+    for route in ROUTES:
+        if f"route.{route}.total" in timings:
+            return route
+    for shortcut in ("replayed", "coalesced"):
+        if f"chat.{shortcut}" in timings:
+            return shortcut
+    return "cache"
+
+
+def _timing_headers(timings: dict) -> dict:
+    stages = ", ".join(
+        f"{name};dur={seconds * 1000:.1f}"
+        for name, seconds in timings.items() if metrics.is_duration(name)
+    )
+    return {
+        "Server-Timing": stages,
+        "X-LLM-Calls": str(timings.get("chat.llm_calls", 0)),
+        "X-LLM-Tokens": f"{timings.get('chat.input_tokens', 0)} in, {timings.get('chat.output_tokens', 0)} out",
+        "X-Chat-Route": _chat_route(timings),
+    }
+
+
+async def _acquire_chat_slot(request: Request) -> asyncio.Semaphore:
+    slots: asyncio.Semaphore = request.app.state.chat_slots
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=CHAT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Too many concurrent chats, try again shortly.")
+    return slots
+
+
 @app.post("/chat", response_model=ChatResponse, dependencies=[Depends(verify_api_key)])
-def chat(body: ChatRequest):
+async def chat(
+    body: ChatRequest, request: Request, response: Response,
+    idempotency_key: Optional[str] = Header(default=None, min_length=1, max_length=255),
+):
+    """Send an Idempotency-Key to make retries safe: a repeat within
+    IDEMPOTENCY_TTL returns the first reply instead of running again."""
     if not body.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
+    slots = await _acquire_chat_slot(request)
+    timings: dict = {}
     try:
-        reply = run_agent(body.message.strip())
+        reply = await arun_agent(body.message.strip(), timings=timings, idempotency_key=idempotency_key)
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
-        error_msg = str(e).lower()
-        if "authentication" in error_msg or "api key" in error_msg:
-            raise HTTPException(status_code=502, detail="Invalid Groq API key.")
-        if "connection" in error_msg:
-            raise HTTPException(status_code=503, detail="Could not reach Groq API.")
-        raise HTTPException(status_code=502, detail=str(e))
+        raise _agent_error(e)
+    finally:
+        slots.release()
+    if "chat.replayed" in timings:
+        response.headers["Idempotent-Replayed"] = "true"
+    if TIMING_HEADERS:
+        response.headers.update(_timing_headers(timings))
     return ChatResponse(response=reply)
 
 
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream", dependencies=[Depends(verify_api_key)])
+async def chat_stream(body: ChatRequest, request: Request):
+    """Server-sent events: one `data: {"token": ...}` per Final Answer token,
+    then an `event: done` carrying per-stage timings (seconds) and LLM call/token counts."""
+    message = body.message.strip()
+    if not message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    slots = await _acquire_chat_slot(request)
+
+    async def events():
+        timings: dict = {}
+        try:
+            async for token in astream_agent(message, timings=timings):
+                yield _sse({"token": token})
+            yield _sse(timings, event="done")
+        except Exception as e:
+            err = _agent_error(e)
+            yield _sse({"status": err.status_code, "detail": err.detail}, event="error")
+        finally:
+            slots.release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# List endpoints page by id: pass a response's X-Next-Cursor back as
+# `before` for the next (older) page. The /stream variants write NDJSON
+# straight from a SQLite cursor, oldest first, resumable with `after`.
+
+MAX_PAGE_SIZE = 500
+
+
+def _ndjson(rows: Iterator[Dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def _with_cursor(response: Response, rows: List[Dict], cursor: Optional[int]) -> List[Dict]:
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = str(cursor)
+    return rows
+
+
 @app.get("/history", response_model=List[HistoryItem], dependencies=[Depends(verify_api_key)])
-def history(limit: int = 10):
-    rows = get_history(limit=limit)
-    return [HistoryItem(**r) for r in rows]
+def history(
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Turns oldest first; the latest `limit` unless `before` is given."""
+    rows, cursor = get_history_page(limit=limit, before=before, since=since, until=until)
+    return _with_cursor(response, rows, cursor)
+
+
+@app.get("/history/stream", dependencies=[Depends(verify_api_key)])
+def history_stream(
+    after: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    rows = iter_history(after=after, since=since, until=until)
+    return StreamingResponse(_ndjson(rows), media_type="application/x-ndjson")
 
 
 @app.delete("/history", dependencies=[Depends(verify_api_key)])
@@ -82,8 +286,97 @@ def delete_history():
 
 
 @app.get("/priorities", dependencies=[Depends(verify_api_key)])
-def priorities():
-    return get_all_priorities()
+def priorities(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[int] = None,
+    active: Optional[bool] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Priorities newest first, one page at a time."""
+    rows, cursor = get_priorities_page(
+        limit=limit, before=before, active=active, since=since, until=until,
+    )
+    return _with_cursor(response, rows, cursor)
+
+
+@app.patch("/priorities/{priority_id}", dependencies=[Depends(verify_api_key)])
+def update_priority(priority_id: int, update: PriorityUpdate):
+    """Complete ("done"), drop or reactivate a priority; closed ones are no longer retrieved."""
+    row = set_priority_status(priority_id, update.status)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Priority not found")
+    return row
+
+
+@app.get("/priorities/stream", dependencies=[Depends(verify_api_key)])
+def priorities_stream(
+    after: Optional[int] = None,
+    active: Optional[bool] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    rows = iter_priorities(after=after, active=active, since=since, until=until)
+    return StreamingResponse(_ndjson(rows), media_type="application/x-ndjson")
+
+
+def _public_job(job: dict) -> dict:
+    return {k: v for k, v in job.items() if k not in ("path", "run_after")}
+
+
+@app.post("/import", status_code=202, dependencies=[Depends(verify_api_key)])
+async def import_history(request: Request):
+    """Upload NDJSON turns/priorities/summaries (see bulk.py); returns a job to poll."""
+    try:
+        job = await bulk.spool_import(request.stream())
+    except bulk.ImportTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return _public_job(job)
+
+
+@app.get("/import/{job_id}", dependencies=[Depends(verify_api_key)])
+def import_status(job_id: int):
+    job = get_import_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return _public_job(job)
+
+
+@app.get("/export", dependencies=[Depends(verify_api_key)])
+def export_history():
+    """Stream the whole session as NDJSON, in the format /import accepts."""
+    return StreamingResponse(
+        bulk.export_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="focus-assistant-export.ndjson"'},
+    )
+
+
+@app.get("/retention", dependencies=[Depends(verify_api_key)])
+def get_retention():
+    """The effective retention policy and where it comes from (session or default)."""
+    return retention.policy_for("default")
+
+
+@app.put("/retention", dependencies=[Depends(verify_api_key)])
+def put_retention(policy: RetentionPolicy):
+    """Override the RETENTION_* defaults for this session; nulls mean no limit."""
+    set_retention_policy("default", policy.max_turns, policy.max_days, policy.mode)
+    return retention.policy_for("default")
+
+
+@app.post("/retention/run", status_code=202, dependencies=[Depends(verify_api_key)])
+def run_retention():
+    """Start a retention pass now rather than at the next interval."""
+    retention.trigger_retention()
+    return {"message": "Retention pass started."}
+
+
+@app.post("/reindex", dependencies=[Depends(verify_api_key)])
+async def reindex_memory():
+    """Rebuild the vector store from SQLite, e.g. after losing CHROMA_DIR."""
+    return {"documents": await run_chroma(reindex)}
 
 
 if __name__ == "__main__":
@@ -2,122 +2,716 @@
 Dual memory layer: SQLite (ordered history) + ChromaDB (semantic retrieval).
 """
 
+import asyncio
+import functools
+import hashlib
 import os
-from typing import List, Dict, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import Any, Callable, List, Dict, Optional, Tuple, TypeVar, Union
 
-import chromadb
+import embeddings
+import metrics
+from embeddings import embed
 
 from database import (
-    get_connection, save_summary, get_latest_summary,
-    get_turn_count, save_priority as db_save_priority,
+    get_connection, run_db, save_summary, has_summary, get_last_summary, get_summaries_since, keyword_search,
+    get_priority, find_active_priority,
+    enqueue_summary_job, claim_summary_job, complete_summary_job, fail_summary_job,
+    enqueue_embedding, get_embedding_batch, delete_embedding_batch, has_pending_embeddings,
 )
 
+T = TypeVar("T")
+
 # ── ChromaDB setup ────────────────────────────────────────────────
 
 CHROMA_DIR = os.getenv("CHROMA_DIR", "./chroma_db")
 
-_chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
-_collection = _chroma_client.get_or_create_collection(
-    name="conversation_memory",
-    metadata={"hnsw:space": "cosine"},
-)
+# chromadb takes most of a second to import, so the client is created on
+# first use (or by warm_up()) rather than when this module is imported.
+_chroma_client = None
+_chroma_client_lock = threading.Lock()
+
+
+def _get_chroma_client():
+    global _chroma_client
+    if _chroma_client is None:
+        with _chroma_client_lock:
+            if _chroma_client is None:
+                import chromadb
+                _chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
+    return _chroma_client
+
+# ── Session partitions ────────────────────────────────────────────
+#
+# Each session gets its own collection, so an HNSW query only ever walks
+# that session's vectors and its count() is the partition's size. Handles
+# are opened lazily and kept in a bounded LRU along with a cached count.
+
+LEGACY_COLLECTION = "conversation_memory"  # pre-partitioning, shared by all sessions
+CHROMA_OPEN_COLLECTIONS = int(os.getenv("CHROMA_OPEN_COLLECTIONS", "64"))
+
+
+# Another process (API workers, the Streamlit app) may fill or shrink a
+# partition through the shared queue, so a cached count is only trusted
+# briefly, and zero (which short-circuits search) never.
+PARTITION_COUNT_TTL = 5.0
+
+
+class _Partition:
+    __slots__ = ("collection", "count", "counted_at")
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.count: Optional[int] = None  # None = unknown, recount on demand
+        self.counted_at = 0.0
+
+
+_partitions: "OrderedDict[str, _Partition]" = OrderedDict()
+_partitions_lock = threading.Lock()
+_legacy_drained = False
+
+
+def _partition_name(session_id: str) -> str:
+    return "session_" + hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:20]
+
+
+def _migrate_legacy(session_id: str, collection) -> None:
+    """Move this session's documents out of the old shared collection."""
+    global _legacy_drained
+    if _legacy_drained:
+        return
+    try:
+        legacy = _get_chroma_client().get_collection(LEGACY_COLLECTION)
+    except Exception:
+        _legacy_drained = True  # Never existed, or already emptied and deleted
+        return
+    got = legacy.get(
+        where={"session_id": session_id}, include=["documents", "metadatas", "embeddings"],
+    )
+    if got["ids"]:
+        collection.upsert(
+            ids=got["ids"], documents=got["documents"],
+            metadatas=got["metadatas"], embeddings=got["embeddings"],
+        )
+        legacy.delete(ids=got["ids"])
+    if legacy.count() == 0:
+        _get_chroma_client().delete_collection(LEGACY_COLLECTION)
+        _legacy_drained = True
+
+
+def _partition(session_id: str) -> _Partition:
+    with _partitions_lock:
+        part = _partitions.get(session_id)
+        if part is not None:
+            _partitions.move_to_end(session_id)
+            return part
+
+        collection = _get_chroma_client().get_or_create_collection(
+            name=_partition_name(session_id),
+            metadata={"hnsw:space": "cosine", "session_id": session_id},
+        )
+        _migrate_legacy(session_id, collection)
+        part = _partitions[session_id] = _Partition(collection)
+        while len(_partitions) > CHROMA_OPEN_COLLECTIONS:
+            _partitions.popitem(last=False)
+        return part
+
+
+def _partition_count(session_id: str) -> int:
+    part = _partition(session_id)
+    now = time.monotonic()
+    if not part.count or now - part.counted_at > PARTITION_COUNT_TTL:
+        part.count = part.collection.count()
+        part.counted_at = now
+    return part.count
+
+
+def _drop_partition(session_id: str) -> None:
+    with _partitions_lock:
+        _partitions.pop(session_id, None)
+        try:
+            _get_chroma_client().delete_collection(_partition_name(session_id))
+        except Exception:
+            pass  # Nothing was ever embedded for this session
+
+# Embedding inference and HNSW queries are CPU-bound and hold the GIL for
+# long stretches; async callers run them on their own small pool.
+CHROMA_WORKERS = int(os.getenv("CHROMA_WORKERS", "2"))
+_chroma_executor = ThreadPoolExecutor(max_workers=CHROMA_WORKERS, thread_name_prefix="chroma")
+
+
+async def run_chroma(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Await a blocking ChromaDB call on the dedicated vector-store executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_chroma_executor, functools.partial(fn, *args, **kwargs))
+
+
+# ── Write-behind embedding buffer ─────────────────────────────────
+#
+# Writers queue documents in SQLite's embedding_queue inside the same
+# transaction as the row they describe, then return. A flusher thread
+# embeds and upserts them into ChromaDB in batches of EMBED_BATCH_SIZE,
+# at least every EMBED_FLUSH_INTERVAL seconds. The queue survives
+# crashes, and upserts make replaying a half-flushed batch harmless.
+# semantic_search() flushes its own session first (read-your-writes).
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_FLUSH_INTERVAL = float(os.getenv("EMBED_FLUSH_INTERVAL", "0.5"))
+
+_embed_wakeup = threading.Event()
+_embed_stop = threading.Event()
+_embed_thread: Optional[threading.Thread] = None
+_embed_thread_lock = threading.Lock()
+_flush_lock = threading.Lock()  # one flusher at a time; clear_memory() holds it too
+_unflushed = 0  # approximate; only used to wake the flusher early
+
+
+def _queue_embedding(conn, doc_id: str, document: str, metadata: Dict) -> None:
+    """Queue a document for ChromaDB; commits with the caller's transaction."""
+    global _unflushed
+    enqueue_embedding(conn, doc_id, document, metadata)
+    _unflushed += 1
+
+
+def _notify_embedder() -> None:
+    """Call after committing queued embeddings."""
+    start_embedding_flusher()
+    if _unflushed >= EMBED_BATCH_SIZE:
+        _embed_wakeup.set()
+
+
+# (doc_id, document, metadata) for each kind of remembered row; doc ids
+# match the FTS index so hybrid retrieval can fuse both result lists.
+
+def _turn_doc(session_id: str, turn_id: int, user_msg: str, agent_msg: str) -> Tuple[str, str, Dict]:
+    return (
+        f"conv_{session_id}_{turn_id}",
+        f"User: {user_msg}\nAssistant: {agent_msg}",
+        {"session_id": session_id, "type": "conversation", "turn_id": str(turn_id)},
+    )
+
+
+def _priority_doc(session_id: str, priority_id: int, text: str) -> Tuple[str, str, Dict]:
+    return (
+        f"priority_{priority_id}",
+        f"Priority: {text}",
+        {"type": "priority", "session_id": session_id, "priority_id": str(priority_id)},
+    )
+
+
+def _summary_doc(session_id: str, turn_count: int, summary: str, level: int = 0) -> Tuple[str, str, Dict]:
+    return (
+        f"summary_{session_id}_{turn_count}" + (f"_L{level}" if level else ""),
+        f"Summary: {summary}",
+        {"session_id": session_id, "type": "summary", "level": level},
+    )
+
+
+def _archive_doc(session_id: str, last_turn_id: int, summary: str) -> Tuple[str, str, Dict]:
+    return (
+        f"archive_{session_id}_{last_turn_id}",
+        f"Summary: {summary}",
+        {"session_id": session_id, "type": "summary", "last_turn_id": str(last_turn_id)},
+    )
+
+
+def _queue_turn_doc(conn, session_id: str, turn_id: int, user_msg: str, agent_msg: str) -> None:
+    _queue_embedding(conn, *_turn_doc(session_id, turn_id, user_msg, agent_msg))
+
+
+def _queue_priority_doc(conn, session_id: str, priority_id: int, text: str) -> None:
+    _queue_embedding(conn, *_priority_doc(session_id, priority_id, text))
+
+
+def _queue_summary_doc(conn, session_id: str, turn_count: int, summary: str, level: int = 0) -> None:
+    _queue_embedding(conn, *_summary_doc(session_id, turn_count, summary, level))
+
+
+def flush_embeddings(session_id: Optional[str] = None, batch_size: Optional[int] = None) -> int:
+    """Embed everything queued (for one session, if given); return the count."""
+    flushed = 0
+    while True:
+        done = _flush_batch(session_id, batch_size or EMBED_BATCH_SIZE)
+        if not done:
+            return flushed
+        flushed += done
+
+
+def _flush_batch(session_id: Optional[str], batch_size: int) -> int:
+    """Embed and upsert one queued batch; returns its size (0 once drained).
+
+    The lock covers one batch from read to queue delete, so a concurrent
+    delete cannot be undone by a stale upsert. Between batches it is
+    released, so read-your-writes flushes and deletes do not wait for a
+    whole import or every session's backlog.
+    """
+    global _unflushed
+    with _flush_lock:
+        batch = get_embedding_batch(batch_size, session_id)
+        if not batch:
+            if session_id is None:
+                _unflushed = 0
+            return 0
+        vectors = embed([item["document"] for item in batch])
+        by_session: Dict[str, List[int]] = {}
+        for i, item in enumerate(batch):
+            by_session.setdefault(item["metadata"].get("session_id", "default"), []).append(i)
+        for sid, idx in by_session.items():
+            part = _partition(sid)
+            with metrics.span("chroma.upsert"):
+                part.collection.upsert(
+                    ids=[batch[i]["doc_id"] for i in idx],
+                    documents=[batch[i]["document"] for i in idx],
+                    embeddings=[vectors[i] for i in idx],
+                    metadatas=[batch[i]["metadata"] for i in idx],
+                )
+            part.count = None
+        delete_embedding_batch([item["id"] for item in batch])
+    return len(batch)
+
+
+def _embedding_flusher_loop() -> None:
+    while not _embed_stop.is_set():
+        _embed_wakeup.wait(EMBED_FLUSH_INTERVAL)
+        _embed_wakeup.clear()
+        try:
+            flush_embeddings()
+        except Exception:
+            pass  # Rows stay queued; retried on the next tick
+
+
+def start_embedding_flusher() -> None:
+    """Start the background flusher if this process has none yet."""
+    global _embed_thread
+    if _embed_thread is not None and _embed_thread.is_alive():
+        return
+    with _embed_thread_lock:
+        if _embed_thread is None or not _embed_thread.is_alive():
+            _embed_stop.clear()
+            _embed_thread = threading.Thread(
+                target=_embedding_flusher_loop, name="embedding-flusher", daemon=True,
+            )
+            _embed_thread.start()
+
+
+def stop_embedding_flusher(timeout: float = 5.0) -> None:
+    """Stop the flusher and embed whatever is still queued."""
+    global _embed_thread
+    _embed_stop.set()
+    _embed_wakeup.set()
+    with _embed_thread_lock:
+        if _embed_thread is not None:
+            _embed_thread.join(timeout)
+            _embed_thread = None
+    flush_embeddings()
 
 
 # ── Save / retrieve conversation turns (SQLite) ──────────────────
 
-def save_turn(user_msg: str, agent_msg: str, session_id: str = "default") -> None:
-    """Persist a conversation turn to SQLite and embed it in ChromaDB."""
+# How long a turn saved under an Idempotency-Key is replayed for that key
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+
+def _insert_turn(
+    user_msg: str, agent_msg: str, session_id: str, idempotency_key: Optional[str] = None,
+) -> Tuple[int, int, int]:
+    """Insert a turn and queue its embedding.
+
+    Returns (turn_id, session turn count, memory version after the insert).
+    Raises sqlite3.IntegrityError if a live turn already holds idempotency_key.
+    """
+    with metrics.span("db.insert_turn"), get_connection() as conn:
+        if idempotency_key is not None:
+            # Keys older than the TTL may be reused; release them first
+            conn.execute(
+                "UPDATE conversations SET idempotency_key = NULL "
+                "WHERE session_id = ? AND idempotency_key = ? AND created_at < datetime('now', ?)",
+                (session_id, idempotency_key, f"-{IDEMPOTENCY_TTL} seconds"),
+            )
+        cursor = conn.execute(
+            "INSERT INTO conversations (user_msg, agent_msg, session_id, idempotency_key) VALUES (?, ?, ?, ?)",
+            (user_msg, agent_msg, session_id, idempotency_key),
+        )
+        turn_id = cursor.lastrowid
+        _queue_turn_doc(conn, session_id, turn_id, user_msg, agent_msg)
+        # The insert trigger bumped the counter; read it before committing so
+        # concurrent writers on the same session each see their own count.
+        counters = conn.execute(
+            "SELECT turn_count, memory_version FROM session_counters WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        conn.commit()
+    _notify_embedder()
+    return turn_id, counters["turn_count"], counters["memory_version"]
+
+
+def get_idempotent_turn(idempotency_key: str, session_id: str = "default") -> Optional[Dict[str, str]]:
+    """The turn saved under this key within IDEMPOTENCY_TTL, else None."""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT id, user_msg, agent_msg, created_at FROM conversations "
+            "WHERE session_id = ? AND idempotency_key = ? AND created_at >= datetime('now', ?)",
+            (session_id, idempotency_key, f"-{IDEMPOTENCY_TTL} seconds"),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+# ── Priorities ────────────────────────────────────────────────────
+
+def store_priority(text: str, session_id: str = "default") -> int:
+    """Persist a priority to SQLite and queue it for ChromaDB."""
     with get_connection() as conn:
         cursor = conn.execute(
-            "INSERT INTO conversations (user_msg, agent_msg, session_id) VALUES (?, ?, ?)",
-            (user_msg, agent_msg, session_id),
+            "INSERT INTO priorities (text, session_id) VALUES (?, ?)",
+            (text, session_id),
         )
+        row_id = cursor.lastrowid
+        _queue_priority_doc(conn, session_id, row_id, text)
         conn.commit()
-        turn_id = cursor.lastrowid
+    _notify_embedder()
+    return row_id
+
+
+# A restated goal should update the one already saved, not sit beside it
+# in retrieval. Near-duplicates are found by exact text, then by nearest
+# neighbour among the session's active priorities.
+
+PRIORITY_DEDUP_THRESHOLD = float(os.getenv("PRIORITY_DEDUP_THRESHOLD", "0.85"))  # cosine similarity
+PRIORITY_STATUSES = ("active", "done", "dropped")
+_PRIORITY_NEIGHBOURS = 3
 
-    # Embed in ChromaDB for semantic retrieval
-    combined = f"User: {user_msg}\nAssistant: {agent_msg}"
-    _collection.add(
-        documents=[combined],
-        metadatas=[{"session_id": session_id, "type": "conversation", "turn_id": str(turn_id)}],
-        ids=[f"conv_{session_id}_{turn_id}"],
-    )
 
-    # Trigger summarisation every 20 turns
-    count = get_turn_count(session_id)
-    if count > 0 and count % 20 == 0:
-        _summarize(session_id, count)
+def find_similar_priority(
+    text: str, session_id: str = "default", threshold: float = PRIORITY_DEDUP_THRESHOLD,
+) -> Optional[Dict]:
+    """The active priority most similar to `text`, if at least `threshold`; else None."""
+    exact = find_active_priority(session_id, text)
+    if exact is not None:
+        return {**exact, "similarity": 1.0}
+
+    if has_pending_embeddings(session_id):
+        with metrics.span("chroma.flush_on_read"):
+            flush_embeddings(session_id)
+    total = _partition_count(session_id)
+    if total == 0:
+        return None
+    with metrics.span("chroma.query"):
+        results = _partition(session_id).collection.query(
+            query_embeddings=embed([text]),
+            n_results=min(_PRIORITY_NEIGHBOURS, total),
+            where={"type": "priority"},
+        )
+    for doc_id, distance in zip(results["ids"][0], results["distances"][0]):
+        similarity = 1 - distance
+        if similarity < threshold:
+            break
+        # Chroma may lag SQLite by one flush; trust the row, not the index
+        row = get_priority(int(doc_id.rsplit("_", 1)[1]), session_id)
+        if row is not None and row["active"]:
+            return {**row, "similarity": similarity}
+    return None
+
+
+def upsert_priority(text: str, session_id: str = "default") -> Tuple[int, bool]:
+    """Save a priority or merge it into a near-duplicate; returns (id, merged)."""
+    match = find_similar_priority(text, session_id)
+    if match is None:
+        return store_priority(text, session_id), False
+    with get_connection() as conn:
+        # The newest wording wins: a restatement usually carries the current
+        # deadline or scope. The doc id is unchanged, so Chroma replaces it.
+        cursor = conn.execute(
+            "UPDATE priorities SET text = ?, mentions = mentions + 1, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = ? AND active = 1",
+            (text, match["id"]),
+        )
+        if cursor.rowcount == 0:
+            conn.rollback()  # closed since the lookup
+            return store_priority(text, session_id), False
+        _queue_priority_doc(conn, session_id, match["id"], text)
+        conn.commit()
+    _notify_embedder()
+    metrics.incr("priorities.merged")
+    return match["id"], True
+
+
+def set_priority_status(priority_id: int, status: str, session_id: str = "default") -> Optional[Dict]:
+    """Complete ('done'), drop or reactivate a priority; None if it does not exist.
+
+    Closed priorities stay in SQLite for listings and export but leave the
+    search indexes, so retrieval only surfaces live goals.
+    """
+    if status not in PRIORITY_STATUSES:
+        raise ValueError(f"status must be one of {PRIORITY_STATUSES}")
+    active = status == "active"
+    doc_id = f"priority_{priority_id}"
+    # Hold the flush lock so a queued copy cannot be embedded after the delete
+    with _flush_lock:
+        with get_connection() as conn:
+            row = conn.execute(
+                "UPDATE priorities SET status = ?, active = ?, updated_at = CURRENT_TIMESTAMP "
+                "WHERE id = ? AND session_id = ? RETURNING text",
+                (status, 1 if active else 0, priority_id, session_id),
+            ).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            if active:
+                _queue_priority_doc(conn, session_id, priority_id, row["text"])
+            else:
+                conn.execute("DELETE FROM embedding_queue WHERE doc_id = ?", (doc_id,))
+            conn.commit()
+        if not active:
+            part = _partition(session_id)
+            part.collection.delete(ids=[doc_id])
+            part.count = None
+    if active:
+        _notify_embedder()
+    return get_priority(priority_id, session_id)
+
+
+def _should_summarize(count: int) -> bool:
+    return count > 0 and count % SUMMARY_INTERVAL == 0
+
+
+def save_turn(
+    user_msg: str, agent_msg: str, session_id: str = "default", idempotency_key: Optional[str] = None,
+) -> int:
+    """Persist a conversation turn to SQLite and queue it for ChromaDB.
+
+    Returns the session's memory version including this turn.
+    """
+    _, count, version = _insert_turn(user_msg, agent_msg, session_id, idempotency_key)
+
+    # Queue summarisation every 20 turns; the background worker runs it
+    if _should_summarize(count):
+        _queue_summary(session_id, count)
+    return version
+
+
+async def asave_turn(
+    user_msg: str, agent_msg: str, session_id: str = "default", idempotency_key: Optional[str] = None,
+) -> int:
+    """Async save_turn; the SQLite commit runs on the database executor."""
+    _, count, version = await run_db(_insert_turn, user_msg, agent_msg, session_id, idempotency_key)
+    if _should_summarize(count):
+        await run_db(_queue_summary, session_id, count)
+    return version
 
 
 def get_history(limit: int = 10, session_id: str = "default") -> List[Dict[str, str]]:
     """Retrieve the last N conversation turns in chronological order."""
     with get_connection() as conn:
         rows = conn.execute(
-            "SELECT user_msg, agent_msg, created_at FROM conversations "
+            "SELECT id, user_msg, agent_msg, created_at FROM conversations "
             "WHERE session_id = ? ORDER BY id DESC LIMIT ?",
             (session_id, limit),
         ).fetchall()
     return [dict(r) for r in reversed(rows)]
 
 
+async def aget_history(limit: int = 10, session_id: str = "default") -> List[Dict[str, str]]:
+    return await run_db(get_history, limit=limit, session_id=session_id)
+
+
 # ── Semantic search (ChromaDB) ────────────────────────────────────
 
 def semantic_search(query: str, n_results: int = 3, session_id: str = "default") -> List[Dict]:
     """Return the top-N semantically similar past entries from ChromaDB."""
-    total = _collection.count()
+    # Read-your-writes: this session's queued documents must be searchable
+    if has_pending_embeddings(session_id):
+        with metrics.span("chroma.flush_on_read"):
+            flush_embeddings(session_id)
+
+    total = _partition_count(session_id)
     if total == 0:
         return []
 
-    results = _collection.query(
-        query_texts=[query],
-        n_results=min(n_results, total),
-        where={"session_id": session_id},
-    )
+    query_embeddings = embed([query])
+    with metrics.span("chroma.query"):
+        results = _partition(session_id).collection.query(
+            query_embeddings=query_embeddings,
+            n_results=min(n_results, total),
+        )
 
     out = []
-    for doc, meta, dist in zip(
+    for doc_id, doc, meta, dist in zip(
+        results["ids"][0],
         results["documents"][0],
         results["metadatas"][0],
         results["distances"][0],
     ):
-        out.append({"document": doc, "metadata": meta, "distance": dist})
+        out.append({"id": doc_id, "document": doc, "metadata": meta, "distance": dist})
     return out
 
 
-# ── Format history for prompt injection ───────────────────────────
+async def asemantic_search(query: str, n_results: int = 3, session_id: str = "default") -> List[Dict]:
+    return await run_chroma(semantic_search, query, n_results=n_results, session_id=session_id)
 
-def format_history_for_prompt(
+
+# ── Hybrid retrieval (BM25 + vector) ──────────────────────────────
+#
+# Exact terms (project names, dates) are what embeddings miss most, so
+# the FTS5 keyword index and the vector store are queried side by side and
+# merged with reciprocal rank fusion: score = sum(1 / (RRF_K + rank)).
+
+RRF_K = 60
+HYBRID_CANDIDATES = 10  # per retriever, before fusion
+
+
+def _fuse(keyword_hits: List[Dict], vector_hits: List[Dict], n_results: int) -> List[Dict]:
+    fused: Dict[str, Dict] = {}
+    for rank, hit in enumerate(vector_hits, start=1):
+        entry = fused.setdefault(hit["id"], {**hit, "score": 0.0})
+        entry["score"] += 1 / (RRF_K + rank)
+    for rank, hit in enumerate(keyword_hits, start=1):
+        entry = fused.setdefault(hit["doc_id"], {
+            "id": hit["doc_id"],
+            "document": hit["content"],
+            "metadata": {"type": hit["kind"]},
+            "distance": None,
+            "score": 0.0,
+        })
+        entry["score"] += 1 / (RRF_K + rank)
+    ranked = sorted(fused.values(), key=lambda e: e["score"], reverse=True)
+    return ranked[:n_results]
+
+
+def hybrid_search(query: str, n_results: int = 3, session_id: str = "default") -> List[Dict]:
+    """Keyword + semantic retrieval fused by rank; same shape as semantic_search()."""
+    candidates = max(n_results, HYBRID_CANDIDATES)
+    vector_future = _chroma_executor.submit(semantic_search, query, candidates, session_id)
+    keyword_hits = keyword_search(query, candidates, session_id)
+    return _fuse(keyword_hits, vector_future.result(), n_results)
+
+
+async def ahybrid_search(query: str, n_results: int = 3, session_id: str = "default") -> List[Dict]:
+    candidates = max(n_results, HYBRID_CANDIDATES)
+    keyword_hits, vector_hits = await asyncio.gather(
+        run_db(keyword_search, query, candidates, session_id),
+        asemantic_search(query, n_results=candidates, session_id=session_id),
+    )
+    return _fuse(keyword_hits, vector_hits, n_results)
+
+
+# ── Context assembly for prompt injection ─────────────────────────
+#
+# The context block is filled to a token budget in priority order: the
+# summary snapshot, the two newest exchanges, related hits by relevance
+# (skipping any already in the recent window), then older recent turns.
+# Long messages are clipped so one pasted document cannot crowd out the rest.
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+MAX_MESSAGE_CHARS = 600
+MAX_SUMMARY_CHARS = 1200
+ALWAYS_RECENT_TURNS = 2
+_SECTION_OVERHEAD_TOKENS = 40  # the [SECTION] header/footer lines
+_DIGEST_LABELS = ("Recent", "Earlier", "Long-term")  # by summary level
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def _clip(text: str, limit: int) -> str:
+    text = text.strip()
+    return text if len(text) <= limit else text[:limit].rstrip() + " …"
+
+
+def _normalise(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def assemble_context(
     history: List[Dict[str, str]],
-    semantic_results: Optional[List[Dict]] = None,
-    summary: Optional[str] = None,
+    related: Optional[List[Dict]] = None,
+    summary: Union[str, List[Dict], None] = None,
     user_name: str = "User",
+    session_id: str = "default",
+    budget_tokens: Optional[int] = None,
 ) -> str:
-    """Build a structured, timestamped history block for the system prompt."""
+    """Build the structured, timestamped context block for the prompt.
+
+    `summary` is the get_summary_digest() list, or a single snapshot string.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget_tokens is None else budget_tokens
+    used = _SECTION_OVERHEAD_TOKENS
+
+    def fits(text: str) -> bool:
+        nonlocal used
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            return False
+        used += cost
+        return True
+
+    # Summary digest: one snapshot per level in a fixed MAX_SUMMARY_CHARS,
+    # so its cost stays flat however long the history grows. The leaf is
+    # fitted first; higher levels are dropped before it when space is short.
+    levels = [{"level": 0, "summary": summary}] if isinstance(summary, str) else list(summary or [])
+    snapshot_lines: List[str] = []
+    if levels:
+        share = MAX_SUMMARY_CHARS // len(levels)
+        for entry in sorted(levels, key=lambda e: e["level"]):
+            line = f"{_DIGEST_LABELS[min(entry['level'], 2)]}: {_clip(entry['summary'], share)}"
+            if not fits(line):
+                break
+            snapshot_lines.insert(0, line)
+
+    # Render each recent turn once; remember which ones make the cut
+    rendered_turns = []
+    for turn in history:
+        ts = turn.get("created_at", "")
+        rendered_turns.append(
+            f"[{ts} — {user_name}] {_clip(turn['user_msg'], MAX_MESSAGE_CHARS)}\n"
+            f"[{ts} — Sage] {_clip(turn['agent_msg'], MAX_MESSAGE_CHARS)}\n"
+        )
+    keep_turn = [False] * len(history)
+    newest_first = list(range(len(history) - 1, -1, -1))
+    for i in newest_first[:ALWAYS_RECENT_TURNS]:
+        keep_turn[i] = fits(rendered_turns[i])
+
+    # Related hits that duplicate the recent window add tokens, not information
+    recent_ids = {f"conv_{session_id}_{turn['id']}" for turn in history if "id" in turn}
+    recent_texts = {_normalise(f"User: {t['user_msg']}\nAssistant: {t['agent_msg']}") for t in history}
+    related_lines = []
+    for item in sorted(related or [], key=lambda r: r.get("score", -(r.get("distance") or 0.0)), reverse=True):
+        if item.get("id") in recent_ids or _normalise(item["document"]) in recent_texts:
+            continue
+        line = f"  {_clip(item['document'], MAX_MESSAGE_CHARS * 2)}"
+        if fits(line):
+            related_lines.append(line)
+
+    # Older turns stay contiguous: stop at the first one that does not fit
+    for i in newest_first[ALWAYS_RECENT_TURNS:]:
+        keep_turn[i] = fits(rendered_turns[i])
+        if not keep_turn[i]:
+            break
+
     parts: List[str] = []
 
-    # Priority snapshot from last summarisation
-    if summary:
+    # Priority snapshots, longest horizon first
+    if snapshot_lines:
         parts.append("[PRIORITY SNAPSHOT — auto-generated summary]")
-        parts.append(summary)
+        parts.extend(snapshot_lines)
         parts.append("[END SNAPSHOT]\n")
 
-    # Semantically retrieved context (may overlap with recent history — that's fine)
-    if semantic_results:
-        parts.append("[RELATED PAST CONTEXT — semantically retrieved]")
-        for item in semantic_results:
-            parts.append(f"  {item['document']}")
+    # Retrieved context that is not already in the recent window
+    if related_lines:
+        parts.append("[RELATED PAST CONTEXT — retrieved by relevance]")
+        parts.extend(related_lines)
         parts.append("[END RELATED CONTEXT]\n")
 
     # Ordered recent history with labelled timestamps
-    if history:
-        parts.append(f"[RECENT HISTORY — last {len(history)} exchanges]")
-        for turn in history:
-            ts = turn.get("created_at", "")
-            parts.append(f"[{ts} — {user_name}] {turn['user_msg']}")
-            parts.append(f"[{ts} — Sage] {turn['agent_msg']}")
-            parts.append("")
+    kept = [rendered_turns[i] for i in range(len(history)) if keep_turn[i]]
+    if kept:
+        parts.append(f"[RECENT HISTORY — last {len(kept)} exchanges]")
+        parts.extend(kept)
         parts.append("[END HISTORY]")
-    else:
+    elif not history:
         parts.append("No prior conversations.")
 
     return "\n".join(parts).strip()
@@ -125,54 +719,252 @@ def format_history_for_prompt(
 
 # ── Summarisation ─────────────────────────────────────────────────
 
-def _summarize(session_id: str, turn_count: int) -> None:
-    """Summarise the last 20 turns into a priority snapshot."""
-    from langchain_groq import ChatGroq
+SUMMARY_MODEL = "llama-3.1-8b-instant"
+SUMMARY_INTERVAL = 20  # turns per leaf snapshot
+SUMMARY_LEVELS = int(os.getenv("SUMMARY_LEVELS", "3"))  # leaf + rollup levels
+SUMMARY_ROLLUP_FANOUT = int(os.getenv("SUMMARY_ROLLUP_FANOUT", "5"))  # snapshots per rollup
 
-    history = get_history(limit=20, session_id=session_id)
-    if not history:
-        return
+_summarizer = None
+
+
+def _get_summarizer():
+    global _summarizer
+    if _summarizer is None and os.getenv("MODEL_NAME") == "fake":
+        from fake_llm import FakeReActChatModel
+        _summarizer = FakeReActChatModel()
+    if _summarizer is None:
+        from langchain_groq import ChatGroq
+        _summarizer = ChatGroq(model_name=SUMMARY_MODEL, max_tokens=300)
+    return _summarizer
 
+
+def _transcript(turns: List[Dict]) -> str:
     lines = []
-    for t in history:
+    for t in turns:
         lines.append(f"User: {t['user_msg']}")
         lines.append(f"Assistant: {t['agent_msg']}")
+    return "\n".join(lines)
 
-    transcript = "\n".join(lines)
 
-    summarizer = ChatGroq(model_name="llama-3.1-8b-instant", max_tokens=300)
-    result = summarizer.invoke(
-        f"Summarise this user's key priorities, recurring themes, and blockers "
-        f"from these conversations into a concise priority snapshot (max 5 bullet points):\n\n"
-        f"{transcript}"
-    )
-    summary_text = result.content
+def _store_summary(session_id: str, turn_count: int, summary: str, level: int) -> None:
+    # Queue for ChromaDB so it surfaces in semantic search (replaces on retry)
+    with get_connection() as conn:
+        _queue_summary_doc(conn, session_id, turn_count, summary, level)
+        conn.commit()
+    _notify_embedder()
 
-    # Persist to SQLite
-    save_summary(session_id, summary_text, turn_count)
+    # Persist to SQLite last — it is what marks the step as done
+    save_summary(session_id, summary, turn_count, level)
 
-    # Embed in ChromaDB so it surfaces in semantic search
-    _collection.add(
-        documents=[f"Summary: {summary_text}"],
-        metadatas=[{"session_id": session_id, "type": "summary"}],
-        ids=[f"summary_{session_id}_{turn_count}"],
-    )
 
+def _summarize(session_id: str, turn_count: int) -> None:
+    """Fold the turns since the last snapshot into it, then roll up full levels."""
+    if not has_summary(session_id, turn_count):
+        _summarize_leaf(session_id, turn_count)
+    # Runs even when the leaf already exists, so a rollup lost to a crash
+    # between the two is made on the retry.
+    _rollup(session_id)
 
-# ── Cleanup ───────────────────────────────────────────────────────
 
-def clear_memory(session_id: str = "default") -> None:
-    """Wipe conversation history from both SQLite and ChromaDB."""
+def _history_up_to(session_id: str, turn_count: int, limit: int) -> List[Dict[str, str]]:
+    """The `limit` turns ending at the session's turn_count-th, oldest first.
+
+    Jobs can run late (queue, retries), so the window is counted back from
+    the job's turn rather than from the newest turn. The counter only grows,
+    so the turns after it are the newest (counter - turn_count).
+    """
     with get_connection() as conn:
-        conn.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
-        conn.execute("DELETE FROM priorities WHERE session_id = ?", (session_id,))
-        conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
-        conn.commit()
+        rows = conn.execute(
+            "SELECT id, user_msg, agent_msg, created_at FROM conversations "
+            "WHERE session_id = ? ORDER BY id DESC LIMIT ? OFFSET COALESCE("
+            "(SELECT MAX(turn_count - ?, 0) FROM session_counters WHERE session_id = ?), 0)",
+            (session_id, limit, turn_count, session_id),
+        ).fetchall()
+    return [dict(r) for r in reversed(rows)]
+
+
+def _summarize_leaf(session_id: str, turn_count: int) -> None:
+    previous = get_last_summary(session_id, 0)
+    delta = SUMMARY_INTERVAL
+    if previous and previous["turn_count"] < turn_count:
+        delta = min(turn_count - previous["turn_count"], 2 * SUMMARY_INTERVAL)
+    history = _history_up_to(session_id, turn_count, delta)
+    if not history:
+        return
 
-    # Clear ChromaDB entries for this session
+    if previous:
+        prompt = (
+            f"Here is the running priority snapshot for this user:\n{previous['summary']}\n\n"
+            f"Update it with these newer conversations. Keep what still matters, drop what is "
+            f"resolved, and note new priorities, recurring themes and blockers "
+            f"(max 5 bullet points):\n\n{_transcript(history)}"
+        )
+    else:
+        prompt = (
+            f"Summarise this user's key priorities, recurring themes, and blockers "
+            f"from these conversations into a concise priority snapshot (max 5 bullet points):\n\n"
+            f"{_transcript(history)}"
+        )
+    with metrics.span("summary.llm"):
+        result = _get_summarizer().invoke(prompt)
+    _store_summary(session_id, turn_count, result.content, 0)
+
+
+def _rollup(session_id: str) -> None:
+    """Every SUMMARY_ROLLUP_FANOUT snapshots at one level make one at the next."""
+    for level in range(1, SUMMARY_LEVELS):
+        parent = get_last_summary(session_id, level)
+        children = get_summaries_since(session_id, level - 1, parent["id"] if parent else 0)
+        if len(children) < SUMMARY_ROLLUP_FANOUT:
+            return
+        # Older children are already folded into the newer ones
+        snapshots = "\n\n".join(
+            f"(up to turn {c['turn_count']})\n{c['summary']}" for c in children[-SUMMARY_ROLLUP_FANOUT:]
+        )
+        earlier = f"Long-term summary so far:\n{parent['summary']}\n\n" if parent else ""
+        with metrics.span("summary.rollup"):
+            result = _get_summarizer().invoke(
+                f"{earlier}Fold these consecutive priority snapshots (oldest first) into a "
+                f"long-term summary of the user's lasting goals, recurring themes and unresolved "
+                f"blockers. Drop one-off details (max 4 bullet points):\n\n{snapshots}"
+            )
+        _store_summary(session_id, children[-1]["turn_count"], result.content, level)
+
+
+# ── Background summary worker ─────────────────────────────────────
+#
+# save_turn() only enqueues a row in summary_jobs; daemon threads claim
+# jobs, call the LLM and retry failures with exponential backoff. Jobs
+# survive restarts, and a claimed job whose worker died is re-claimed
+# once its lease runs out.
+
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "1"))
+SUMMARY_MAX_ATTEMPTS = int(os.getenv("SUMMARY_MAX_ATTEMPTS", "5"))
+SUMMARY_RETRY_BASE = float(os.getenv("SUMMARY_RETRY_BASE", "5"))
+SUMMARY_LEASE_SECONDS = 300.0
+SUMMARY_POLL_INTERVAL = 5.0
+
+_summary_wakeup = threading.Event()
+_summary_stop = threading.Event()
+_summary_threads: List[threading.Thread] = []
+_summary_lock = threading.Lock()
+
+
+def _queue_summary(session_id: str, turn_count: int) -> None:
+    if enqueue_summary_job(session_id, turn_count):
+        start_summary_worker()
+        _summary_wakeup.set()
+
+
+def _run_summary_job(job: Dict) -> None:
     try:
-        ids = _collection.get(where={"session_id": session_id})["ids"]
-        if ids:
-            _collection.delete(ids=ids)
-    except Exception:
-        pass
+        with metrics.span("summary.total"):
+            _summarize(job["session_id"], job["turn_count"])
+    except Exception as e:
+        metrics.incr("summary.failures")
+        retry_at = None
+        if job["attempts"] < SUMMARY_MAX_ATTEMPTS:
+            retry_at = time.time() + SUMMARY_RETRY_BASE * 2 ** (job["attempts"] - 1)
+        fail_summary_job(job["id"], str(e), retry_at)
+    else:
+        complete_summary_job(job["id"])
+
+
+def _summary_worker_loop() -> None:
+    while not _summary_stop.is_set():
+        try:
+            job = claim_summary_job(time.time(), SUMMARY_LEASE_SECONDS, SUMMARY_MAX_ATTEMPTS)
+        except Exception:
+            job = None  # DB briefly locked or unavailable — try again after the poll
+        if job is None:
+            _summary_wakeup.wait(SUMMARY_POLL_INTERVAL)
+            _summary_wakeup.clear()
+            continue
+        _run_summary_job(job)
+
+
+def start_summary_worker() -> None:
+    """Start the background summary workers if this process has none yet."""
+    with _summary_lock:
+        if any(t.is_alive() for t in _summary_threads):
+            return
+        _summary_stop.clear()
+        _summary_threads[:] = [
+            threading.Thread(target=_summary_worker_loop, name=f"summary-worker-{i}", daemon=True)
+            for i in range(max(1, SUMMARY_WORKERS))
+        ]
+        for t in _summary_threads:
+            t.start()
+
+
+def stop_summary_worker(timeout: float = 5.0) -> None:
+    _summary_stop.set()
+    _summary_wakeup.set()
+    with _summary_lock:
+        for t in _summary_threads:
+            t.join(timeout)
+        _summary_threads.clear()
+
+
+# ── Reindex ───────────────────────────────────────────────────────
+
+def reindex(session_id: str = "default") -> int:
+    """Rebuild a session's ChromaDB documents from SQLite; return how many.
+
+    Everything goes back through the write-behind queue, and unchanged text
+    is served from the embedding cache, so this is cheap after a first run.
+    """
+    with get_connection() as conn:
+        for row in conn.execute(
+            "SELECT id, user_msg, agent_msg FROM conversations WHERE session_id = ?", (session_id,),
+        ).fetchall():
+            _queue_turn_doc(conn, session_id, row["id"], row["user_msg"], row["agent_msg"])
+        for row in conn.execute(
+            "SELECT id, text FROM priorities WHERE session_id = ? AND active = 1", (session_id,),
+        ).fetchall():
+            _queue_priority_doc(conn, session_id, row["id"], row["text"])
+        for row in conn.execute(
+            "SELECT summary, turn_count, kind, level, last_turn_id FROM summaries WHERE session_id = ?",
+            (session_id,),
+        ).fetchall():
+            if row["kind"] == "archive":
+                _queue_embedding(conn, *_archive_doc(session_id, row["last_turn_id"], row["summary"]))
+            else:
+                _queue_summary_doc(conn, session_id, row["turn_count"], row["summary"], row["level"])
+        conn.commit()
+    return flush_embeddings(session_id)
+
+
+# ── Warm-up ───────────────────────────────────────────────────────
+
+def warm_up(session_id: str = "default") -> None:
+    """Open the vector store and load the embedding model ahead of the first request."""
+    _partition_count(session_id)
+    embeddings.warm_up()
+
+
+# ── Cleanup ───────────────────────────────────────────────────────
+
+def clear_memory(session_id: str = "default") -> None:
+    """Wipe conversation history from both SQLite and ChromaDB."""
+    # Hold the flush lock so an in-flight batch cannot re-add deleted documents
+    with _flush_lock:
+        with get_connection() as conn:
+            conn.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM priorities WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM conversations_archive WHERE session_id = ?", (session_id,))
+            # Reset the turn count but keep memory_version monotonic, so answers
+            # cached before the wipe can never match a post-wipe version
+            conn.execute(
+                "UPDATE session_counters SET turn_count = 0, memory_version = memory_version + 1 "
+                "WHERE session_id = ?",
+                (session_id,),
+            )
+            conn.execute("DELETE FROM response_cache WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM summary_jobs WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM embedding_queue WHERE session_id = ?", (session_id,))
+            conn.commit()
+
+        # Clear ChromaDB entries for this session
+        _drop_partition(session_id)
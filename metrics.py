@@ -0,0 +1,157 @@
+"""
+In-process latency metrics.
+
+Named histograms aggregate timings across requests (time-to-first-token,
+total latency, per-stage work) and counters tally events such as stage
+timeouts; callers that want a per-request breakdown pass a plain dict to
+span() and get the same timings written into it. Per-request counts (LLM
+calls, tokens) use observe_count(). render_prometheus() serves /metrics.
+"""
+
+import bisect
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# Upper bounds in seconds, Prometheus-style (cumulative, with an implicit +Inf)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+class Histogram:
+    """Fixed-bucket histogram with interpolated quantiles."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, unit: str = "seconds"):
+        self.buckets = tuple(buckets)
+        self.unit = unit
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self.counts):
+                if n and seen + n >= rank:
+                    lower = self.buckets[i - 1] if i > 0 else 0.0
+                    if i == len(self.buckets):
+                        return lower  # +Inf bucket: best we can say is "above the last bound"
+                    return lower + (self.buckets[i] - lower) * (rank - seen) / n
+                seen += n
+            return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": round(self.quantile(0.50), 6),
+            "p99": round(self.quantile(0.99), 6),
+        }
+
+
+_histograms: Dict[str, Histogram] = {}
+_counters: Dict[str, float] = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(name: str, buckets: Sequence[float] = DEFAULT_BUCKETS, unit: str = "seconds") -> Histogram:
+    """Get or create a histogram; buckets and unit only apply on creation."""
+    hist = _histograms.get(name)
+    if hist is None:
+        with _registry_lock:
+            hist = _histograms.setdefault(name, Histogram(buckets, unit))
+    return hist
+
+
+def observe(name: str, seconds: float, timings: Optional[Dict[str, float]] = None) -> None:
+    """Record one timing; also store it in `timings` when given."""
+    histogram(name).observe(seconds)
+    if timings is not None:
+        timings[name] = round(seconds, 6)
+
+
+def observe_count(
+    name: str, value: float, timings: Optional[Dict[str, float]] = None,
+    buckets: Sequence[float] = COUNT_BUCKETS,
+) -> None:
+    """Record a per-request count (LLM calls, tokens); like observe() otherwise."""
+    histogram(name, buckets, unit="count").observe(value)
+    if timings is not None:
+        timings[name] = value
+
+
+def is_duration(name: str) -> bool:
+    """True if `name` is a histogram of seconds (as opposed to counts)."""
+    hist = _histograms.get(name)
+    return hist is not None and hist.unit == "seconds"
+
+
+@contextmanager
+def span(name: str, timings: Optional[Dict[str, float]] = None) -> Iterator[None]:
+    """Time the enclosed block under `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, timings)
+
+
+def incr(name: str, amount: float = 1) -> None:
+    with _registry_lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    out = {name: hist.snapshot() for name, hist in sorted(_histograms.items())}
+    with _registry_lock:
+        out.update({name: {"count": value} for name, value in sorted(_counters.items())})
+    return out
+
+
+# ── Prometheus text exposition ────────────────────────────────────
+
+def _metric_name(prefix: str, name: str, suffix: str = "") -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{name}") + suffix
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render_prometheus(prefix: str = "focus_assistant") -> str:
+    """All histograms and counters in Prometheus text format (version 0.0.4)."""
+    lines: List[str] = []
+    for name, hist in sorted(_histograms.items()):
+        metric = _metric_name(prefix, name, "_seconds" if hist.unit == "seconds" else "")
+        with hist._lock:
+            counts, total, count = list(hist.counts), hist.sum, hist.count
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, n in zip(list(hist.buckets) + [math.inf], counts):
+            cumulative += n
+            lines.append(f'{metric}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+        lines.append(f"{metric}_sum {_format_value(round(total, 6))}")
+        lines.append(f"{metric}_count {count}")
+    with _registry_lock:
+        counters = sorted(_counters.items())
+    for name, value in counters:
+        metric = _metric_name(prefix, name, "_total")
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
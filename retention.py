@@ -0,0 +1,204 @@
+"""
+Retention: fold old turns into summaries so memory stops growing.
+
+A session's policy (its retention_policies row, else the RETENTION_*
+defaults) keeps the newest max_turns turns and/or the last max_days days.
+Older turns are summarised RETENTION_CHUNK_TURNS at a time into "archive"
+summaries. Those summaries are embedded and retrieved like any other
+memory, while the turns themselves leave the vector store. Their SQLite
+rows are moved to conversations_archive (mode "archive") or deleted
+(mode "delete").
+
+A daemon thread makes a pass every RETENTION_INTERVAL seconds and sleeps
+RETENTION_THROTTLE between chunks, so the LLM and the write lock are
+never hogged. Each pass also trims the on-disk embedding cache to
+EMBED_DISK_CACHE_MAX_ENTRIES. After a pass that changed anything it merges
+the FTS index and refreshes planner stats. VACUUM runs once at least
+RETENTION_VACUUM_MIN_FREE of the file is free pages.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import embeddings
+import memory
+import metrics
+from database import (
+    get_connection, get_retention_policy, get_session_ids, get_expired_turns,
+    free_page_ratio, compact_database,
+)
+
+RETENTION_MAX_TURNS = int(os.getenv("RETENTION_MAX_TURNS", "0"))  # 0 = no limit
+RETENTION_MAX_DAYS = float(os.getenv("RETENTION_MAX_DAYS", "0"))  # 0 = no limit
+RETENTION_MODE = os.getenv("RETENTION_MODE", "archive")
+RETENTION_CHUNK_TURNS = int(os.getenv("RETENTION_CHUNK_TURNS", "40"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "3600"))
+RETENTION_THROTTLE = float(os.getenv("RETENTION_THROTTLE", "1.0"))
+RETENTION_MAX_CHUNKS = int(os.getenv("RETENTION_MAX_CHUNKS", "20"))  # per session per pass
+RETENTION_VACUUM_MIN_FREE = float(os.getenv("RETENTION_VACUUM_MIN_FREE", "0.2"))
+RETENTION_MODES = ("archive", "delete")
+
+
+def policy_for(session_id: str) -> Dict:
+    """Effective policy: the session's override, else the env defaults."""
+    policy = get_retention_policy(session_id)
+    if policy is not None:
+        return {**policy, "source": "session"}
+    return {
+        "max_turns": RETENTION_MAX_TURNS or None,
+        "max_days": RETENTION_MAX_DAYS or None,
+        "mode": RETENTION_MODE,
+        "source": "default",
+    }
+
+
+def _fold_prompt(turns: List[Dict]) -> str:
+    return (
+        f"These conversations are being archived. Summarise the user's goals, decisions, "
+        f"priorities and blockers from them so they can still be recalled later "
+        f"(max 8 bullet points, keep names, dates and numbers):\n\n{memory._transcript(turns)}"
+    )
+
+
+def _fold(session_id: str, turns: List[Dict], mode: str) -> bool:
+    """Replace `turns` with one archive summary; False if another worker got there first."""
+    with metrics.span("retention.summarize"):
+        summary = memory._get_summarizer().invoke(_fold_prompt(turns)).content
+    summary = f"[{turns[0]['created_at']} to {turns[-1]['created_at']}] {summary}"
+    ids = [(t["id"],) for t in turns]
+    doc_ids = [memory._turn_doc(session_id, t["id"], t["user_msg"], t["agent_msg"])[0] for t in turns]
+    last_turn_id = turns[-1]["id"]
+
+    # The flush lock keeps queued copies of these turns from being embedded
+    # while they are removed. Chroma goes first: if the process dies before
+    # the SQLite commit, the turns are still there and the next pass simply
+    # folds them again.
+    with memory._flush_lock:
+        part = memory._partition(session_id)
+        part.collection.delete(ids=doc_ids)
+        part.count = None
+
+        conn = get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if mode == "archive":
+                conn.executemany(
+                    "INSERT OR IGNORE INTO conversations_archive (id, user_msg, agent_msg, session_id, created_at) "
+                    "SELECT id, user_msg, agent_msg, session_id, created_at FROM conversations WHERE id = ?",
+                    ids,
+                )
+            deleted = conn.executemany("DELETE FROM conversations WHERE id = ?", ids).rowcount
+            if deleted != len(ids):
+                conn.rollback()
+                return False
+            conn.executemany("DELETE FROM embedding_queue WHERE doc_id = ?", [(d,) for d in doc_ids])
+            turn_count = conn.execute(
+                "SELECT turn_count FROM session_counters WHERE session_id = ?", (session_id,),
+            ).fetchone()["turn_count"]
+            conn.execute(
+                "INSERT INTO summaries (session_id, summary, turn_count, kind, last_turn_id) "
+                "VALUES (?, ?, ?, 'archive', ?)",
+                (session_id, summary, turn_count, last_turn_id),
+            )
+            memory._queue_embedding(conn, *memory._archive_doc(session_id, last_turn_id, summary))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    memory._notify_embedder()
+    metrics.incr("retention.turns_folded", len(ids))
+    return True
+
+
+def compact_session(session_id: str, max_chunks: int = RETENTION_MAX_CHUNKS) -> int:
+    """Fold up to `max_chunks` chunks of expired turns; returns turns folded."""
+    policy = policy_for(session_id)
+    if not policy["max_turns"] and not policy["max_days"]:
+        return 0
+    folded = 0
+    for _ in range(max_chunks):
+        if _retention_stop.is_set():
+            break
+        turns = get_expired_turns(session_id, policy["max_turns"], policy["max_days"], RETENTION_CHUNK_TURNS)
+        # A turn limit expires one turn per new message; wait for a full
+        # chunk rather than writing a summary per turn. Age limits fold
+        # whatever has expired.
+        if not turns or (len(turns) < RETENTION_CHUNK_TURNS and not policy["max_days"]):
+            break
+        if not _fold(session_id, turns, policy["mode"]):
+            break
+        folded += len(turns)
+        _retention_stop.wait(RETENTION_THROTTLE)
+    return folded
+
+
+def run_retention(max_chunks: int = RETENTION_MAX_CHUNKS) -> int:
+    """One pass over every session, then compaction; returns turns folded."""
+    folded = 0
+    for session_id in get_session_ids():
+        try:
+            folded += compact_session(session_id, max_chunks)
+        except Exception:
+            metrics.incr("retention.failures")  # e.g. LLM down; retried next pass
+    try:
+        pruned = embeddings.prune_disk_cache()
+    except sqlite3.OperationalError:
+        pruned = 0  # Busy; the next pass tries again
+    vacuum = free_page_ratio() >= RETENTION_VACUUM_MIN_FREE
+    if folded or pruned or vacuum:
+        try:
+            with metrics.span("retention.compact"):
+                compact_database(vacuum)
+        except sqlite3.OperationalError:
+            pass  # Busy; the next pass tries again
+    return folded
+
+
+# ── Background retention worker ───────────────────────────────────
+
+_retention_wakeup = threading.Event()
+_retention_stop = threading.Event()
+_retention_thread: Optional[threading.Thread] = None
+_retention_thread_lock = threading.Lock()
+
+
+def _retention_worker_loop() -> None:
+    while not _retention_stop.is_set():
+        try:
+            run_retention()
+        except Exception:
+            pass  # DB briefly unavailable — try again next interval
+        _retention_wakeup.wait(RETENTION_INTERVAL)
+        _retention_wakeup.clear()
+
+
+def start_retention_worker() -> None:
+    """Start the retention worker if this process has none yet."""
+    global _retention_thread
+    if _retention_thread is not None and _retention_thread.is_alive():
+        return
+    with _retention_thread_lock:
+        if _retention_thread is None or not _retention_thread.is_alive():
+            _retention_stop.clear()
+            _retention_thread = threading.Thread(
+                target=_retention_worker_loop, name="retention", daemon=True,
+            )
+            _retention_thread.start()
+
+
+def trigger_retention() -> None:
+    """Run a pass now instead of waiting for the next interval."""
+    start_retention_worker()
+    _retention_wakeup.set()
+
+
+def stop_retention_worker(timeout: float = 5.0) -> None:
+    global _retention_thread
+    _retention_stop.set()
+    _retention_wakeup.set()
+    with _retention_thread_lock:
+        if _retention_thread is not None:
+            _retention_thread.join(timeout)
+            _retention_thread = None
@@ -0,0 +1,137 @@
+"""
+Cheap local pre-router: does this message need the ReAct agent at all?
+
+Every agent turn costs at least one tool-formatted LLM call and up to
+five. Most messages ("thanks!", "rough day today") need no tool, so
+route() picks one of two paths:
+
+  direct  one plain LLM completion over the same memory context
+  agent   the full AgentExecutor loop, for turns likely to need a tool
+
+Rules settle the obvious cases: a short reply to a question the assistant
+just asked ("want me to save that?" "yes") goes to the agent, short
+acknowledgements go direct, and explicit save/recall/completion wording
+goes to the agent. Everything else
+goes to a nearest-prototype classifier. It compares the message's
+embedding with each tool's description plus a few example requests, and
+with examples of plain conversation. Embeddings come from the local
+retrieval model and its cache, so routing adds no network call.
+ROUTER_MODE=agent sends every message to the agent.
+"""
+
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from embeddings import embed
+
+ROUTER_MODE = os.getenv("ROUTER_MODE", "auto")  # auto | agent
+ROUTER_TOOL_THRESHOLD = float(os.getenv("ROUTER_TOOL_THRESHOLD", "0.45"))  # cosine similarity
+ROUTES = ("direct", "agent")
+
+_ACKNOWLEDGEMENTS = frozenset((
+    "hi hey hello morning evening night good thanks thank you thx ty cool great nice "
+    "awesome bye later see lol haha appreciate it much so very").split())
+_MAX_ACK_WORDS = 6
+
+# Wording that almost always needs save_priority, complete_priority or
+# get_priorities. Kept narrow: a miss only costs the classifier a look.
+_TOOL_HINTS = re.compile(
+    r"\b(priorit\w*|goals?|deadlines?|remember|remind|save|track|note that|"
+    r"finished|completed|done with|shipped|drop (it|that|the)|"
+    r"what did i|did i (say|mention)|last (week|month|time)|earlier|previously|recap)\b",
+    re.IGNORECASE,
+)
+
+TOOL_EXAMPLES: Dict[str, List[str]] = {
+    "save_priority": [
+        "My main goal this quarter is to launch the beta",
+        "I need to get the budget approved by Friday",
+        "Add hiring a designer to my list",
+    ],
+    "complete_priority": [
+        "I finally finished the data migration",
+        "The demo is out the door",
+        "We don't need to worry about the offsite anymore",
+    ],
+    "get_priorities": [
+        "What was I stressed about a few weeks ago?",
+        "What have I said about the launch so far?",
+        "What keeps blocking me?",
+    ],
+}
+CHAT_EXAMPLES = [
+    "Thanks, that's helpful",
+    "I'm feeling pretty tired today",
+    "Had a long day of back to back meetings",
+    "Can you say that more briefly?",
+    "Honestly I'm not sure how I feel about it",
+    "That makes sense, I'll think about it",
+]
+
+_prototypes: Optional[Tuple[List[Tuple[str, List[float]]], List[List[float]]]] = None
+_prototypes_lock = threading.Lock()
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _get_prototypes(tools: Dict[str, str]):
+    """(tool name, vector) pairs and chat vectors, embedded once per process."""
+    global _prototypes
+    if _prototypes is None:
+        with _prototypes_lock:
+            if _prototypes is None:
+                texts, names = [], []
+                for name, description in tools.items():
+                    for text in [" ".join((description or name).split())] + TOOL_EXAMPLES.get(name, []):
+                        texts.append(text)
+                        names.append(name)
+                vectors = embed(texts + CHAT_EXAMPLES)
+                _prototypes = list(zip(names, vectors[:len(texts)])), vectors[len(texts):]
+    return _prototypes
+
+
+def _rule(message: str, previous_reply: Optional[str]) -> Optional[str]:
+    words = re.findall(r"[\w']+", message.lower())
+    if previous_reply and previous_reply.rstrip().endswith("?") and len(words) <= _MAX_ACK_WORDS:
+        return "agent"  # "yes"/"sure" may be agreeing to a save the agent offered
+    if not words:
+        return "direct"
+    if len(words) <= _MAX_ACK_WORDS and all(w in _ACKNOWLEDGEMENTS for w in words):
+        return "direct"
+    if _TOOL_HINTS.search(message):
+        return "agent"
+    return None
+
+
+def classify(message: str, tools: Dict[str, str]) -> Tuple[str, str]:
+    """(route, reason) from the embedding classifier alone."""
+    tool_vectors, chat_vectors = _get_prototypes(tools)
+    vector = embed([message])[0]
+    tool, tool_score = max(((name, _cosine(vector, v)) for name, v in tool_vectors), key=lambda t: t[1])
+    chat_score = max(_cosine(vector, v) for v in chat_vectors)
+    if tool_score >= ROUTER_TOOL_THRESHOLD and tool_score > chat_score:
+        return "agent", f"similar to {tool} ({tool_score:.2f})"
+    return "direct", f"no tool match ({tool_score:.2f} vs chat {chat_score:.2f})"
+
+
+def route(message: str, tools: Dict[str, str], previous_reply: Optional[str] = None) -> Tuple[str, str]:
+    """("direct" or "agent", reason) for one user message, given the assistant's last reply."""
+    if ROUTER_MODE == "agent":
+        return "agent", "router off"
+    decided = _rule(message, previous_reply)
+    if decided is not None:
+        return decided, "rule"
+    return classify(message, tools)
+
+
+def warm_up(tools: Dict[str, str]) -> None:
+    """Embed the prototypes ahead of the first message."""
+    if ROUTER_MODE != "agent":
+        _get_prototypes(tools)
@@ -0,0 +1,12 @@
+import os
+
+# Throwaway DB_PATH/CHROMA_DIR and no network: both paths are read when
+# database/memory are first imported, so this runs before any test module.
+from benchmarks import _support
+
+os.environ.setdefault("MODEL_NAME", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "0")
+os.environ.setdefault("FAKE_LLM_TOKENS_PER_SEC", "0")
+
+_support.use_offline_embeddings()
+_support.use_offline_summarizer()
@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+
+import database
+import main
+
+
+def _turns_with_key(key: str) -> int:
+    with database.get_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM conversations WHERE idempotency_key = ?", (key,)).fetchone()[0]
+
+
+async def _with_client(scenario):
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await scenario(client)
+
+
+def test_retry_with_the_same_key_replays_the_first_reply():
+    async def scenario(client):
+        headers = {"Idempotency-Key": "replay-1"}
+        first = await client.post("/chat", json={"message": "How is the demo prep going?"}, headers=headers)
+        retry = await client.post("/chat", json={"message": "How is the demo prep going?"}, headers=headers)
+        return first, retry
+
+    first, retry = asyncio.run(_with_client(scenario))
+    assert first.status_code == retry.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert _turns_with_key("replay-1") == 1
+
+
+def test_concurrent_requests_with_one_key_run_once():
+    async def scenario(client):
+        headers = {"Idempotency-Key": "coalesce-1"}
+        return await asyncio.gather(*[
+            client.post("/chat", json={"message": "Plan my Thursday"}, headers=headers) for _ in range(4)
+        ])
+
+    responses = asyncio.run(_with_client(scenario))
+    assert [r.status_code for r in responses] == [200] * 4
+    assert len({r.json()["response"] for r in responses}) == 1
+    assert _turns_with_key("coalesce-1") == 1
+
+
+def test_reusing_a_key_for_another_message_is_rejected():
+    async def scenario(client):
+        headers = {"Idempotency-Key": "reuse-1"}
+        first = await client.post("/chat", json={"message": "Book the venue"}, headers=headers)
+        reused = await client.post("/chat", json={"message": "Cancel the venue"}, headers=headers)
+        return first, reused
+
+    first, reused = asyncio.run(_with_client(scenario))
+    assert first.status_code == 200
+    assert reused.status_code == 422
+    assert _turns_with_key("reuse-1") == 1
+
+
+def test_requests_without_a_key_are_separate_turns():
+    async def scenario(client):
+        before = database.get_history_page(limit=1)[0]
+        await asyncio.gather(*[client.post("/chat", json={"message": "Same words twice"}) for _ in range(2)])
+        return before
+
+    before = asyncio.run(_with_client(scenario))
+    after_id = before[0]["id"] if before else 0
+    rows = [r for r in database.iter_history(after=after_id) if r["user_msg"] == "Same words twice"]
+    assert len(rows) == 2
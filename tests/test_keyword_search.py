@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DB_PATH"] = os.path.join(_tmp.name, "test.db")
+
+import database  # noqa: E402
+
+
+def _add_turn(session_id: str, text: str) -> None:
+    with database.get_connection() as conn:
+        conn.execute(
+            "INSERT INTO conversations (user_msg, agent_msg, session_id) VALUES (?, ?, ?)",
+            (text, "Noted.", session_id),
+        )
+        conn.commit()
+
+
+def test_keyword_search_stays_in_its_session():
+    database.init_db()
+    for session_id in ("a", "a-2", "not-a", "default", "not-default"):
+        _add_turn(session_id, f"zebra project notes for {session_id}")
+
+    for session_id in ("a", "default"):
+        rows = database.keyword_search("zebra project", session_id=session_id)
+        assert [r["doc_id"].rsplit("_", 1)[0] for r in rows] == [f"conv_{session_id}"]
@@ -0,0 +1,69 @@
+import sqlite3
+
+import database
+
+# The schema as it was before PRAGMA user_version was tracked
+_BASELINE = """
+    CREATE TABLE conversations (
+        id         INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_msg   TEXT    NOT NULL,
+        agent_msg  TEXT    NOT NULL,
+        session_id TEXT    DEFAULT 'default',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE settings (
+        key   TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    CREATE TABLE priorities (
+        id         INTEGER PRIMARY KEY AUTOINCREMENT,
+        text       TEXT    NOT NULL,
+        session_id TEXT    DEFAULT 'default',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        active     BOOLEAN DEFAULT 1
+    );
+    CREATE TABLE summaries (
+        id         INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT    DEFAULT 'default',
+        summary    TEXT    NOT NULL,
+        turn_count INTEGER NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO conversations (user_msg, agent_msg, session_id) VALUES ('walrus budget review', 'Noted.', 'old');
+    INSERT INTO priorities (text, session_id, active) VALUES ('Ship the walrus report', 'old', 1);
+    INSERT INTO priorities (text, session_id, active) VALUES ('Renew the lease', 'old', 0);
+    INSERT INTO summaries (session_id, summary, turn_count) VALUES ('old', 'Talked about the walrus budget.', 20);
+"""
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_baseline_database_migrates_to_latest(tmp_path, monkeypatch):
+    path = str(tmp_path / "baseline.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(_BASELINE)
+    monkeypatch.setattr(database, "DB_PATH", path)
+
+    database.init_db()
+    conn = database.get_connection()
+    assert database.get_schema_version(conn) == len(database.MIGRATIONS)
+
+    # Columns added along the way
+    assert {"idempotency_key"} <= _columns(conn, "conversations")
+    assert {"status", "mentions", "updated_at"} <= _columns(conn, "priorities")
+    assert {"kind", "level", "last_turn_id"} <= _columns(conn, "summaries")
+    assert "created_at" in _columns(conn, "embedding_cache")
+
+    # Existing rows survive and are backfilled into the derived tables
+    statuses = dict(conn.execute("SELECT text, status FROM priorities WHERE session_id = 'old'").fetchall())
+    assert statuses == {"Ship the walrus report": "active", "Renew the lease": "dropped"}
+    counters = conn.execute("SELECT turn_count FROM session_counters WHERE session_id = 'old'").fetchone()
+    assert counters["turn_count"] == 1
+    kinds = sorted(r["kind"] for r in database.keyword_search("walrus", session_id="old"))
+    assert kinds == ["conversation", "priority", "summary"]
+
+    # Running again is a no-op
+    database.init_db()
+    assert database.get_schema_version(conn) == len(database.MIGRATIONS)
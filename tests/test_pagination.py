@@ -0,0 +1,64 @@
+import database
+
+
+def _fill(session_id: str, n: int) -> None:
+    database.init_db()
+    with database.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO conversations (user_msg, agent_msg, session_id) VALUES (?, ?, ?)",
+            [(f"turn {i}", "Noted.", session_id) for i in range(n)],
+        )
+        conn.executemany(
+            "INSERT INTO priorities (text, session_id) VALUES (?, ?)",
+            [(f"goal {i}", session_id) for i in range(n)],
+        )
+        conn.commit()
+
+
+def test_history_pages_walk_back_without_gaps():
+    _fill("paging-history", 7)
+    pages, before = [], None
+    while True:
+        rows, before = database.get_history_page("paging-history", limit=3, before=before)
+        pages.append([r["user_msg"] for r in rows])
+        if before is None:
+            break
+    # Each page is oldest first; pages go from newest to oldest
+    assert pages == [["turn 4", "turn 5", "turn 6"], ["turn 1", "turn 2", "turn 3"], ["turn 0"]]
+
+
+def test_history_cursor_is_absent_on_an_exact_last_page():
+    _fill("paging-exact", 3)
+    rows, cursor = database.get_history_page("paging-exact", limit=3)
+    assert len(rows) == 3 and cursor is None
+
+
+def test_priority_pages_and_stream_resume():
+    _fill("paging-priorities", 5)
+    first, cursor = database.get_priorities_page("paging-priorities", limit=2)
+    second, cursor = database.get_priorities_page("paging-priorities", limit=2, before=cursor)
+    third, cursor = database.get_priorities_page("paging-priorities", limit=2, before=cursor)
+    assert [p["text"] for p in first + second + third] == [f"goal {i}" for i in range(4, -1, -1)]
+    assert cursor is None
+
+    # The stream resumes after the last id a client saw
+    rows = list(database.iter_priorities("paging-priorities", after=third[0]["id"]))
+    assert [p["text"] for p in rows] == [f"goal {i}" for i in range(1, 5)]
+    assert all(p["status"] == "active" for p in rows)
+
+
+def test_history_endpoint_returns_the_cursor_header():
+    from fastapi.testclient import TestClient
+    import main
+
+    _fill("default", 5)
+    client = TestClient(main.app)
+    seen, params = [], {"limit": 2}
+    while True:
+        response = client.get("/history", params=params)
+        assert response.status_code == 200
+        seen = [r["id"] for r in response.json()] + seen
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["before"] = int(response.headers["X-Next-Cursor"])
+    assert seen == [r["id"] for r in database.iter_history("default")]
@@ -0,0 +1,58 @@
+import pytest
+
+import database
+import memory
+
+SESSION = "priority-tests"
+
+
+def _in_chroma(priority_id: int) -> bool:
+    memory.flush_embeddings(SESSION)
+    return bool(memory._partition(SESSION).collection.get(ids=[f"priority_{priority_id}"])["ids"])
+
+
+def _searchable(text: str) -> bool:
+    return any(r["kind"] == "priority" for r in database.keyword_search(text, session_id=SESSION))
+
+
+def test_restated_priority_merges_into_the_existing_one():
+    database.init_db()
+    first, merged = memory.upsert_priority("Ship the beta release by Friday", SESSION)
+    assert not merged
+    second, merged = memory.upsert_priority("Ship the beta release by Friday afternoon", SESSION)
+    assert merged and second == first
+
+    row = database.get_priority(first, SESSION)
+    assert row["text"] == "Ship the beta release by Friday afternoon"  # newest wording wins
+    assert row["mentions"] == 2
+
+    other, merged = memory.upsert_priority("Renew the office lease", SESSION)
+    assert not merged and other != first
+
+
+def test_completed_priority_leaves_retrieval_and_can_be_reopened():
+    database.init_db()
+    priority_id, _ = memory.upsert_priority("Hire a second designer", SESSION)
+    assert _in_chroma(priority_id) and _searchable("designer")
+
+    row = memory.set_priority_status(priority_id, "done", SESSION)
+    assert row["status"] == "done" and not row["active"]
+    assert not _in_chroma(priority_id) and not _searchable("designer")
+
+    # A closed priority is not a merge target: restating it starts a new one
+    restated, merged = memory.upsert_priority("Hire a second designer", SESSION)
+    assert not merged and restated != priority_id
+    memory.set_priority_status(restated, "dropped", SESSION)
+
+    row = memory.set_priority_status(priority_id, "active", SESSION)
+    assert row["status"] == "active" and row["active"]
+    assert _in_chroma(priority_id) and _searchable("designer")
+
+
+def test_status_changes_are_scoped_and_validated():
+    database.init_db()
+    priority_id, _ = memory.upsert_priority("Write the quarterly review", SESSION)
+    assert memory.set_priority_status(priority_id, "done", "someone-else") is None
+    assert database.get_priority(priority_id, SESSION)["status"] == "active"
+    with pytest.raises(ValueError):
+        memory.set_priority_status(priority_id, "paused", SESSION)
@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+import database
+import memory
+import retention
+
+
+@pytest.fixture(autouse=True)
+def _fast_retention(monkeypatch):
+    database.init_db()
+    monkeypatch.setattr(retention, "RETENTION_CHUNK_TURNS", 4)
+    monkeypatch.setattr(retention, "RETENTION_THROTTLE", 0)
+    # A stopped worker (e.g. an earlier test's app shutdown) leaves this set
+    monkeypatch.setattr(retention, "_retention_stop", threading.Event())
+
+
+def _chat(session_id: str, n: int) -> list:
+    for i in range(n):
+        memory.save_turn(f"sprint {i} note about the kiwi migration", f"Noted {i}.", session_id)
+    memory.flush_embeddings(session_id)
+    return [r["id"] for r in database.iter_history(session_id)]
+
+
+def _conv_docs_in_chroma(session_id: str) -> set:
+    memory.flush_embeddings(session_id)
+    ids = memory._partition(session_id).collection.get(where={"type": "conversation"})["ids"]
+    return {int(doc_id.rsplit("_", 1)[1]) for doc_id in ids}
+
+
+def test_expired_turns_fold_into_an_archive_summary():
+    session_id = "retention-archive"
+    ids = _chat(session_id, 10)
+    database.set_retention_policy(session_id, max_turns=3, max_days=None, mode="archive")
+
+    # 7 turns are past the limit: one full chunk folds, the rest waits for the next
+    assert retention.compact_session(session_id) == 4
+    folded, kept = ids[:4], ids[4:]
+    assert [r["id"] for r in database.iter_history(session_id)] == kept
+
+    with database.get_connection() as conn:
+        archived = [r["id"] for r in conn.execute(
+            "SELECT id FROM conversations_archive WHERE session_id = ? ORDER BY id", (session_id,),
+        )]
+        summary = conn.execute(
+            "SELECT summary, last_turn_id FROM summaries WHERE session_id = ? AND kind = 'archive'",
+            (session_id,),
+        ).fetchone()
+    assert archived == folded
+    assert summary["last_turn_id"] == folded[-1]
+
+    # The summary replaces the turns in both indexes
+    assert _conv_docs_in_chroma(session_id) == set(kept)
+    kiwi = {h["doc_id"] for h in database.keyword_search("kiwi", limit=20, session_id=session_id)}
+    assert kiwi == {f"conv_{session_id}_{i}" for i in kept}
+    summaries = database.keyword_search("recurring blockers", session_id=session_id)  # the canned summary
+    assert [h["doc_id"] for h in summaries] == [f"archive_{session_id}_{folded[-1]}"]
+
+
+def test_delete_mode_drops_the_rows():
+    session_id = "retention-delete"
+    ids = _chat(session_id, 6)
+    database.set_retention_policy(session_id, max_turns=2, max_days=None, mode="delete")
+
+    assert retention.compact_session(session_id) == 4
+    assert [r["id"] for r in database.iter_history(session_id)] == ids[4:]
+    with database.get_connection() as conn:
+        assert conn.execute(
+            "SELECT COUNT(*) FROM conversations_archive WHERE session_id = ?", (session_id,),
+        ).fetchone()[0] == 0
+
+
+def test_no_policy_folds_nothing():
+    session_id = "retention-none"
+    _chat(session_id, 6)
+    assert retention.compact_session(session_id) == 0
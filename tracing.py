@@ -0,0 +1,107 @@
+"""
+LangChain callback that turns one agent run into metrics.
+
+Every LLM call (one per ReAct iteration) and every tool call is timed into
+the `llm.call` and `tool.<name>` histograms as it finishes. finish() then
+records the per-request totals: time in the LLM and in tools, the number
+of LLM and tool calls, and prompt/completion tokens. Imported lazily by
+agent.py, like the rest of LangChain.
+"""
+
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+import metrics
+
+
+def _token_usage(response: LLMResult) -> Dict[str, int]:
+    """Prompt/completion tokens from usage_metadata, else the provider's llm_output."""
+    for generations in response.generations:
+        for gen in generations:
+            usage = getattr(getattr(gen, "message", None), "usage_metadata", None)
+            if usage:
+                return {"input": usage.get("input_tokens", 0), "output": usage.get("output_tokens", 0)}
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return {"input": usage.get("prompt_tokens", 0), "output": usage.get("completion_tokens", 0)}
+
+
+class AgentTracer(BaseCallbackHandler):
+    """Per-request tracer; pass in `callbacks` and call finish() afterwards."""
+
+    run_inline = True  # plain bookkeeping, no need for a thread hop in async runs
+
+    def __init__(self, timings: Optional[Dict[str, float]] = None):
+        self.timings = timings
+        self._llm_starts: Dict[UUID, float] = {}
+        self._tool_starts: Dict[UUID, tuple] = {}
+        self.llm_seconds = 0.0
+        self.tool_seconds = 0.0
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    # ── LLM calls ──
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        start = self._llm_starts.pop(run_id, None)
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            metrics.observe("llm.call", elapsed)
+            self.llm_seconds += elapsed
+        self.llm_calls += 1
+        usage = _token_usage(response)
+        self.input_tokens += usage["input"]
+        self.output_tokens += usage["output"]
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_starts.pop(run_id, None)
+        metrics.incr("llm.errors")
+
+    # ── Tool calls ──
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._tool_starts[run_id] = (name, time.perf_counter())
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        name = self._end_tool(run_id)
+        if name:
+            metrics.incr(f"tool.{name}.errors")
+
+    def _end_tool(self, run_id: UUID) -> Optional[str]:
+        started = self._tool_starts.pop(run_id, None)
+        if started is None:
+            return None
+        name, start = started
+        elapsed = time.perf_counter() - start
+        metrics.observe(f"tool.{name}", elapsed)
+        self.tool_seconds += elapsed
+        self.tool_calls += 1
+        return name
+
+    # ── Per-request totals ──
+
+    def finish(self) -> None:
+        metrics.observe("chat.llm", self.llm_seconds, self.timings)
+        metrics.observe("chat.tools", self.tool_seconds, self.timings)
+        metrics.observe_count("chat.llm_calls", self.llm_calls, self.timings)
+        metrics.observe_count("chat.tool_calls", self.tool_calls, self.timings)
+        metrics.observe_count("chat.input_tokens", self.input_tokens, self.timings, metrics.TOKEN_BUCKETS)
+        metrics.observe_count("chat.output_tokens", self.output_tokens, self.timings, metrics.TOKEN_BUCKETS)
+        metrics.incr("llm.calls", self.llm_calls)
+        metrics.incr("llm.input_tokens", self.input_tokens)
+        metrics.incr("llm.output_tokens", self.output_tokens)